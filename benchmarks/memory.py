@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+比较普通模式与紧凑模式 (:class:`wxpy.CompactChat`)，以及是否共享用户资料 (:class:`wxpy.UserProfiles`) 时，
+群聊及群成员所占用的内存
+
+用法::
+
+    python3 benchmarks/memory.py [群聊数量] [每个群的成员数量] [每位用户平均所在的群聊数量]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from wxpy.group import Group, CompactGroup
+from wxpy.profiles import UserProfiles
+from wxpy.response import Response
+
+
+class StubRobot(object):
+    """
+    仅用于提供共享用户资料的机器人替身，避免登陆
+    """
+
+    def __init__(self, shared):
+        self.profiles = UserProfiles() if shared else None
+
+
+def make_raw_groups(groups, members, overlap):
+    """
+    构造与 itchat 返回格式相同的群聊原始数据
+    """
+    raw_groups = list()
+    for g in range(groups):
+        member_list = list()
+        for m in range(members):
+            i = g * members // overlap + m
+            member_list.append({
+                'MemberStatus': 0, 'PYInitial': '', 'PYQuanPin': '', 'RemarkPYInitial': '',
+                'RemarkPYQuanPin': '', 'KeyWord': '', 'Uin': 0, 'AttrStatus': 100000 + i,
+                'UserName': '@{:064x}'.format(i), 'NickName': '用户{}'.format(i),
+                'DisplayName': '群{}成员{}'.format(g, m) if m % 3 else '',
+            })
+        raw_groups.append({
+            'UserName': '@@{:064x}'.format(g), 'NickName': '群聊{}'.format(g),
+            'MemberCount': members, 'MemberList': member_list, 'ChatRoomOwner': member_list[0]['UserName'],
+            'IsOwner': 0, 'Uin': 0, 'ContactFlag': 3, 'Statues': 1, 'RemarkName': '', 'EncryChatRoomId': '',
+        })
+    return raw_groups
+
+
+def measure(group_class, raw_groups, shared):
+    """
+    构造所有群聊对象，并返回其占用的内存 (字节)，包括共享的用户资料
+    """
+    gc.collect()
+    tracemalloc.start()
+    robot = StubRobot(shared)
+    groups = [group_class(Response(raw, robot)) for raw in raw_groups]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del groups, robot
+    return size
+
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    overlap = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    raw_groups = make_raw_groups(groups, members, overlap)
+    total = groups * members
+
+    print('{} groups x {} members, each user in ~{} groups'.format(groups, members, overlap))
+    baseline = None
+    for name, group_class, shared in (
+            ('normal', Group, False),
+            ('normal + shared', Group, True),
+            ('compact', CompactGroup, False),
+            ('compact + shared', CompactGroup, True),
+    ):
+        size = measure(group_class, raw_groups, shared)
+        baseline = baseline or size
+        print('{:>16}: {:>8.1f} MB, {:>5.0f} bytes/member, saved {:.1%}'.format(
+            name, size / 1024 / 1024, size / total, 1 - size / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,9 @@ setup(
     install_requires=[
         'itchat>=1.2.27',
     ],
+    extras_require={
+        'stats': ['numpy'],
+    },
     url='https://github.com/youfou/wxpy',
     license='MIT',
     author='Youfou',
@@ -0,0 +1,43 @@
+import random
+
+from wxpy.utils.indexes import SimilarityIndex, normalize, signature
+
+
+def brute_force_top(names, query, k):
+    query = normalize(query).strip()
+    grams = signature(query)
+    scores = dict()
+    for key, texts in names:
+        for text in texts:
+            text = normalize(text).strip()
+            if not text:
+                continue
+            other = signature(text)
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if query in text:
+                score += 1
+            if score > scores.get(key, 0):
+                scores[key] = score
+    return sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+
+def test_substring_without_edge_gram():
+    index = SimilarityIndex()
+    index.add(0, ['ca'])
+    index.add(1, ['bbcc'])
+    assert index.top('c', 1) == [(0, 1.5)]
+
+
+def test_top_matches_brute_force():
+    rnd = random.Random(0)
+    for _ in range(3000):
+        names = [
+            (key, [''.join(rnd.choice('abc ') for _ in range(rnd.randint(0, 6))) for _ in range(rnd.randint(1, 2))])
+            for key in range(rnd.randint(1, 12))
+        ]
+        index = SimilarityIndex()
+        for key, texts in names:
+            index.add(key, texts)
+        query = ''.join(rnd.choice('abc') for _ in range(rnd.randint(1, 4)))
+        k = rnd.randint(1, 4)
+        assert index.top(query, k) == brute_force_top(names, query, k)
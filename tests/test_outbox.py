@@ -0,0 +1,77 @@
+import threading
+import time
+from queue import Full
+
+from wxpy.outbox import Outbox, RateController
+from wxpy.utils.constants import DROP_OLDEST
+
+
+class StubRobot(object):
+    pass
+
+
+def ok(**kwargs):
+    return {'BaseResponse': {'Ret': 0}}
+
+
+def throttled(**kwargs):
+    return {'BaseResponse': {'Ret': 1205}}
+
+
+def test_unlimited_rate_feedback():
+    control = RateController(None, min_rate=0.1, max_rate=2, increase=0.1)
+    repr(control)
+    control.succeeded()
+    assert control.rate is None
+    control.throttled()
+    assert control.rate == 1
+
+
+def test_unlimited_outbox_survives_feedback():
+    outbox = Outbox(StubRobot(), rate=None, chat_rate=None)
+    outbox.control.retries = 0
+    assert outbox.submit('a', ok).result(timeout=5)
+    outbox.submit('a', throttled).exception(timeout=5)
+    time.sleep(0.1)
+    assert outbox.submit('a', ok).result(timeout=5)
+
+
+def test_requeued_send_expires_without_killing_sender():
+    calls = list()
+
+    def throttled_once(**kwargs):
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.3)
+            return throttled()
+        return ok()
+
+    outbox = Outbox(StubRobot(), rate=None, chat_rate=None, max_delay=0.2)
+    future = outbox.submit('a', throttled_once)
+    assert isinstance(future.exception(timeout=5), TimeoutError)
+    assert outbox.expired == 1
+    assert outbox.submit('a', ok).result(timeout=5)
+
+
+def test_requeued_send_is_failed_when_dropped():
+    started = threading.Event()
+    release = threading.Event()
+
+    def throttled_then_wait(**kwargs):
+        started.set()
+        release.wait(5)
+        return throttled()
+
+    outbox = Outbox(StubRobot(), rate=None, chat_rate=None, max_pending=1, overflow=DROP_OLDEST)
+    outbox.control.bucket.rate = 0.01
+    outbox.control.min_rate = 0.01
+    future = outbox.submit('a', throttled_then_wait)
+    started.wait(5)
+    release.set()
+    # 等待被限流的任务重新排队，此时全局频率已被降低，任务将留在队列中
+    deadline = time.time() + 5
+    while not outbox.pending and time.time() < deadline:
+        time.sleep(0.01)
+    outbox.submit('b', ok)
+    assert isinstance(future.exception(timeout=5), Full)
+    assert outbox.dropped == 1
@@ -45,14 +45,20 @@ __author__ = 'Youfou'
 __license__ = 'MIT'
 __copyright__ = '2017, Youfou'
 
+from wxpy.archive import MessageArchive
 from wxpy.bot import Robot
-from wxpy.chat import Chat
+from wxpy.broadcast import Broadcast
+from wxpy.chat import Chat, CompactChat
 from wxpy.chats import Chats
-from wxpy.friend import Friend
-from wxpy.group import Group
+from wxpy.friend import Friend, CompactFriend
+from wxpy.group import Group, CompactGroup
 from wxpy.groups import Groups
-from wxpy.member import Member
-from wxpy.mp import MP
+from wxpy.media import MediaCache
+from wxpy.member import Member, CompactMember
+from wxpy.mp import MP, CompactMP
+from wxpy.outbox import Outbox, RateController, TokenBucket
+from wxpy.profiles import Profile, UserProfiles
+from wxpy.registry import ChatRegistry
 from wxpy.response import Response, ResponseError
 from wxpy.message import Message, MessageConfig, MessageConfigs, Messages
 from wxpy.user import User
@@ -0,0 +1,243 @@
+import datetime
+import json
+import logging
+import queue
+import sqlite3
+import threading
+
+from wxpy.chats import Chats
+from wxpy.utils.indexes import normalize, split_keywords
+from wxpy.utils.tools import get_user_name
+
+logger = logging.getLogger('wxpy')
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS messages ('
+    '    id INTEGER PRIMARY KEY,'
+    '    msg_id TEXT UNIQUE,'
+    '    chat TEXT,'
+    '    member TEXT,'
+    '    type TEXT,'
+    '    create_time INTEGER,'
+    '    text TEXT,'
+    '    raw TEXT'
+    ')',
+    'CREATE INDEX IF NOT EXISTS messages_chat ON messages (chat, create_time)',
+    'CREATE INDEX IF NOT EXISTS messages_member ON messages (member, create_time)',
+    'CREATE INDEX IF NOT EXISTS messages_type ON messages (type, create_time)',
+    'CREATE INDEX IF NOT EXISTS messages_create_time ON messages (create_time)',
+)
+
+# 仅保存索引的全文检索表，内容为按顺序排列的字符二元组
+_FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(grams, content='')"
+
+
+def _bigrams(text):
+    """
+    将文本转化为以空格分隔的字符二元组序列，使中文等不以空格分词的文本可被全文检索
+    """
+    if len(text) < 2:
+        return text
+    return ' '.join(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def _normalize_text(text):
+    if text is not None:
+        return normalize(text)
+
+
+class MessageArchive(object):
+    """
+    | 基于 SQLite 的消息存档，可长期保存和检索大量的历史消息。
+    | 设置为 `robot.messages.archive` 后，每条新消息都会被存档::
+
+        robot.messages.archive = MessageArchive(robot, 'wxpy.db')
+
+    | 写入在后台线程中批量进行，不会阻塞消息监听。数据库使用 WAL 模式，检索时不影响写入。
+    """
+
+    def __init__(self, robot, path, batch_size=200, flush_interval=1, max_pending=100000):
+        """
+        :param robot: 存档所属的机器人，检索到的消息将绑定到这个机器人
+        :param path: SQLite 数据库文件的路径
+        :param batch_size: 每次批量写入的最大消息数量
+        :param flush_interval: 等待凑满一批消息的最长时间(秒)
+        :param max_pending: 等待写入的消息数量上限，超出时新的消息将被丢弃
+        """
+        self.robot = robot
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        #: 因等待写入的消息过多而被丢弃的消息数量
+        self.dropped = 0
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            try:
+                conn.execute(_FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                logger.warning('FTS5 is not available in SQLite, text search will scan the archive')
+                self.fts = False
+            else:
+                self.fts = True
+        conn.close()
+
+        self._pending = queue.Queue(max_pending)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name='wxpy-archive')
+        self._writer.start()
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__name__, self.path)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        # SQLite 自带的 lower() 仅转换 ASCII 字符，因此使用与关键词相同的 normalize() 转换消息文本
+        conn.create_function('normalize', 1, _normalize_text)
+        return conn
+
+    def put(self, msg):
+        """
+        将一条消息加入写入队列 (不会阻塞)
+
+        :param msg: 消息对象
+        """
+        try:
+            self._pending.put_nowait(msg)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """
+        等待所有已加入队列的消息写入完成
+        """
+        self._pending.join()
+
+    def close(self):
+        """
+        写入剩余的消息，并结束后台写入线程
+        """
+        self._pending.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = [self._pending.get()]
+                closing = batch[0] is None
+                while not closing and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._pending.get(timeout=self.flush_interval))
+                    except queue.Empty:
+                        break
+                    closing = batch[-1] is None
+
+                msgs = [msg for msg in batch if msg is not None]
+                # noinspection PyBroadException
+                try:
+                    if msgs:
+                        self._write(conn, msgs)
+                except:
+                    logger.exception('failed to archive {} messages'.format(len(msgs)))
+                finally:
+                    for _ in batch:
+                        self._pending.task_done()
+
+                if closing:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, msgs):
+        with conn:
+            for msg in msgs:
+                text = msg.text if isinstance(msg.text, str) else None
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO messages '
+                    '(msg_id, chat, member, type, create_time, text, raw) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        msg.id and str(msg.id),
+                        msg.get('FromUserName'),
+                        msg.get('ActualUserName'),
+                        msg.type,
+                        msg.get('CreateTime'),
+                        text,
+                        json.dumps(msg.raw, ensure_ascii=False, default=lambda x: None),
+                    )
+                )
+                if self.fts and text and cursor.rowcount:
+                    conn.execute(
+                        'INSERT INTO messages_fts (rowid, grams) VALUES (?, ?)',
+                        (cursor.lastrowid, _bigrams(normalize(text)))
+                    )
+
+    def search(self, text=None, chat=None, member=None, type=None, since=None, until=None, limit=100):
+        """
+        在存档中检索消息
+
+        :param text: 消息文本中的关键词，可用空格分割，需同时包含所有关键词
+        :param chat: 聊天对象或 user_name
+        :param member: 群聊成员或 user_name
+        :param type: 消息类型
+        :param since: 发送时间的起点 (包含)，可为 datetime 或时间戳
+        :param until: 发送时间的终点 (不包含)，可为 datetime 或时间戳
+        :param limit: 最多返回的数量，超出时仅保留最近的消息，为 None 时不限制
+        :return: 匹配的消息，按存档顺序排列
+        """
+
+        from wxpy.message import Message
+
+        def to_timestamp(x):
+            if isinstance(x, datetime.datetime):
+                return x.timestamp()
+            return x
+
+        conditions = list()
+        params = list()
+
+        for column, value in ('chat', chat), ('member', member):
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                params.append(get_user_name(value))
+        if type is not None:
+            conditions.append('type = ?')
+            params.append(type)
+        if since is not None:
+            conditions.append('create_time >= ?')
+            params.append(to_timestamp(since))
+        if until is not None:
+            conditions.append('create_time < ?')
+            params.append(to_timestamp(until))
+
+        if text:
+            keywords = split_keywords(text)
+            # 全文检索的分词器会忽略标点、表情等字符，仅由这些字符组成的关键词无法检索，只能在文本中直接查找
+            phrases = [
+                '"{}"'.format(_bigrams(kw).replace('"', '""'))
+                for kw in keywords if len(kw) > 1 and any(char.isalnum() for char in kw)
+            ]
+            if self.fts and phrases:
+                conditions.append('id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)')
+                params.append(' AND '.join(phrases))
+            for kw in keywords:
+                conditions.append('instr(normalize(text), ?) > 0')
+                params.append(kw)
+
+        sql = 'SELECT raw FROM messages'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        return Chats([Message(json.loads(raw), self.robot) for raw, in reversed(rows)], self.robot)
@@ -1,20 +1,29 @@
+import asyncio
+import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pformat
-from threading import Thread
+from queue import Full
+from threading import Thread, Lock
 
 import itchat
 import logging
 
+from wxpy.broadcast import Broadcast
 from wxpy.chat import Chat
-from wxpy.chats import Chats
-from wxpy.friend import Friend
 from wxpy.group import Group
+from wxpy.media import MediaCache
 from wxpy.message import MessageConfigs, Messages, Message, MessageConfig
-from wxpy.mp import MP
-from wxpy.response import ResponseError
+from wxpy.outbox import Outbox, RateController
+from wxpy.profiles import UserProfiles
+from wxpy.registry import ChatRegistry
+from wxpy.response import Response, ResponseError
 from wxpy.user import User
-from wxpy.utils.constants import SYSTEM
+from wxpy.utils.caches import TTLCache
+from wxpy.utils.constants import SYSTEM, BLOCK, PER_CHAT, HIGH
 from wxpy.utils.tools import handle_response, get_user_name, wrap_user_name, ensure_list
+from wxpy.utils.workers import WorkerPool, OrderedLanes
 
 logger = logging.getLogger('wxpy')
 
@@ -26,7 +35,9 @@ class Robot(object):
 
     def __init__(
             self, save_path=None, console_qr=False, qr_path=None,
-            qr_callback=None, login_callback=None, logout_callback=None
+            qr_callback=None, login_callback=None, logout_callback=None,
+            workers=10, max_pending=1000, overflow=BLOCK, compact=False,
+            share_profiles=False
     ):
         # 在初始化时便会执行登陆操作，需要手机扫描登陆。
         """
@@ -38,6 +49,17 @@ class Robot(object):
         :param qr_callback: 获得二维码时的回调，接收参数: uuid, status, qrcode
         :param login_callback: 登陆时的回调，接收参数同上
         :param logout_callback: 登出时的回调，接收参数同上
+        :param workers: 异步执行已注册函数的工作线程数量，同时也是协程版本发送方法 (如 send_async) 所用的线程数量
+        :param max_pending: 等待执行的消息数量上限，为 0 或 None 时不限制
+        :param overflow:
+            | 等待的消息达到上限时的策略:
+            | BLOCK: 阻塞消息监听，直到有空位 (默认)
+            | DROP_OLDEST: 丢弃最早的等待消息
+            | REJECT: 拒绝新的消息
+        :param compact: 以紧凑的方式保存好友、群聊、群成员和公众号，可显著降低大量群成员所占用的内存，详见 :class:`CompactChat`
+        :param share_profiles:
+            | 让同一用户在多个群聊中的成员对象共享用户资料，详见 :class:`UserProfiles`
+            | 仅在用户普遍同时处于多个群聊时才能节省内存，否则反而会增加内存占用，因此默认不启用
         """
 
         self.core = itchat.Core()
@@ -49,9 +71,30 @@ class Robot(object):
             loginCallback=login_callback, exitCallback=logout_callback
         )
 
+        self.compact = compact
+        self.profiles = UserProfiles() if share_profiles else None
+        self.registry = ChatRegistry(self)
         self.message_configs = MessageConfigs(self)
+        self.pool = WorkerPool(workers, max_pending, overflow)
+        self.lanes = OrderedLanes(self.pool)
+        self.executor = ThreadPoolExecutor(workers)
+        self.outbox = Outbox(self)
+
+        #: 各类操作的频率控制器 (:class:`RateController`)，会根据服务器的返回值自动调整频率。
+        #: 可通过各控制器的 `rate` 属性获取当前允许的频率 (每秒的次数)
+        self.rate_controls = dict(
+            send=self.outbox.control,
+            add_friend=RateController(0.2, min_rate=0.01, max_rate=1, increase=0.02),
+            add_members=RateController(0.2, min_rate=0.01, max_rate=1, increase=0.02),
+        )
         self.messages = Messages(robot=self)
 
+        #: 已上传文件的 media_id 缓存 (:class:`MediaCache`)，可替换为保存到文件的缓存，设为 None 时不使用缓存
+        self.media_cache = MediaCache()
+
+        #: 用户详细信息的缓存，以 user_name 为键，默认有效期为 10 分钟
+        self.details_cache = TTLCache(600)
+
         self.file_helper = Chat(wrap_user_name('filehelper'))
         self.file_helper.robot = self
         self.file_helper.nick_name = '文件传输助手'
@@ -61,6 +104,11 @@ class Robot(object):
 
         self.save_path = save_path
 
+        self._loop = None
+        self._loop_lock = Lock()
+        # 按聊天对象顺序执行的协程: user_name => 最后一个协程的完成状态
+        self._coroutine_lanes = dict()
+
     def __repr__(self):
         return '<{}: {}>'.format(self.__class__.__name__, self.self.name)
 
@@ -107,7 +155,11 @@ class Robot(object):
         :param update: 是否更新
         :return: 聊天对象合集
         """
-        return Chats(self.friends(update) + self.groups(update) + self.mps(update), self)
+        if update:
+            self.friends(update)
+            self.groups(update)
+            self.mps(update)
+        return self.registry.chats()
 
     def friends(self, update=False):
         """
@@ -116,17 +168,11 @@ class Robot(object):
         :param update: 是否更新
         :return: 聊天对象合集
         """
+        if update:
+            self.core.get_friends(update=update)
+            self.registry.invalidate()
+        return self.registry.friends()
 
-        @handle_response(Friend)
-        def do():
-            return self.core.get_friends(update=update)
-
-        ret = do()
-        ret.source = self
-
-        return ret
-
-    @handle_response(Group)
     def groups(self, update=False, contact_only=False):
         """
         获取所有群聊
@@ -135,9 +181,21 @@ class Robot(object):
         :param contact_only: 是否限于保存为联系人的群聊
         :return: 群聊合集
         """
-        return self.core.get_chatrooms(update=update, contactOnly=contact_only)
 
-    @handle_response(MP)
+        @handle_response(Group)
+        def do():
+            return self.core.get_chatrooms(update=update, contactOnly=contact_only)
+
+        if contact_only:
+            ret = do()
+            self.registry.invalidate()
+            return ret
+
+        if update:
+            self.core.get_chatrooms(update=update)
+            self.registry.invalidate()
+        return self.registry.groups()
+
     def mps(self, update=False):
         """
         获取所有公众号
@@ -145,38 +203,70 @@ class Robot(object):
         :param update: 是否更新
         :return: 聊天对象合集
         """
-        return self.core.get_mps(update=update)
+        if update:
+            self.core.get_mps(update=update)
+            self.registry.invalidate()
+        return self.registry.mps()
 
     @handle_response(User)
-    def user_details(self, user_or_users, chunk_size=50):
+    def user_details(self, user_or_users, chunk_size=50, concurrency=1, retries=2, use_cache=True):
         """
         获取单个或批量获取多个用户的详细信息(地区、性别、签名等)，但不可用于群聊成员
 
+        | 获取到的详细信息会保存在 :attr:`details_cache` 中，有效期内再次获取时无需请求。
+        | 当用户数量较多时，可增大 `concurrency`，以并行的方式请求各批用户。
+
         :param user_or_users: 单个或多个用户对象或 user_name
         :param chunk_size: 分配请求时的单批数量，目前为 50
+        :param concurrency: 同时进行请求的最大批数
+        :param retries: 每批请求失败时的重试次数
+        :param use_cache: 是否使用缓存中未过期的详细信息
         :return: 单个或多个用户用户的详细信息
         """
 
-        def chunks():
-            total = ensure_list(user_or_users)
-            for i in range(0, len(total), chunk_size):
-                yield total[i:i + chunk_size]
-
-        @handle_response()
         def process_one_chunk(_chunk):
-            return self.core.update_friend(userName=get_user_name(_chunk))
-
-        if isinstance(user_or_users, (list, tuple)):
-            ret = list()
-            for chunk in chunks():
-                chunk_ret = process_one_chunk(chunk)
-                if isinstance(chunk_ret, list):
-                    ret += chunk_ret
+            chunk_ret = self.core.update_friend(userName=_chunk)
+            return [Response(details, self) for details in ensure_list(chunk_ret) or list()]
+
+        def fetch(_chunk):
+            for attempt in range(retries + 1):
+                try:
+                    chunk_ret = process_one_chunk(_chunk)
+                except Exception as e:
+                    if attempt >= retries:
+                        raise
+                    logger.warning('failed to get user details, retrying: {}'.format(e))
+                    time.sleep(0.5 * 2 ** attempt)
                 else:
-                    ret.append(chunk_ret)
-            return ret
+                    for details in chunk_ret:
+                        self.details_cache.set(details.get('UserName'), details)
+                    return chunk_ret
+
+        user_names = [get_user_name(user) for user in ensure_list(user_or_users) or list()]
+
+        found = dict()
+        if use_cache:
+            for user_name in user_names:
+                details = self.details_cache.get(user_name)
+                if details is not None:
+                    found[user_name] = details
+
+        missing = list(OrderedDict.fromkeys(x for x in user_names if x not in found))
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+
+        if concurrency > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(min(concurrency, len(chunks))) as executor:
+                results = list(executor.map(fetch, chunks))
         else:
-            return process_one_chunk(user_or_users)
+            results = map(fetch, chunks)
+
+        for chunk_ret in results:
+            for details in chunk_ret:
+                found[details.get('UserName')] = details
+
+        if not isinstance(user_or_users, (list, tuple)):
+            return found.get(user_names[0])
+        return [found[user_name] for user_name in user_names if user_name in found]
 
     def search(self, name=None, **attributes):
         """
@@ -192,18 +282,20 @@ class Robot(object):
     # add / create
 
     @handle_response()
-    def add_friend(self, user, verify_content=''):
+    def add_friend(self, user, verify_content='', auto_update=True):
         """
         添加用户为好友
 
         :param user: 用户对象或用户名
         :param verify_content: 验证说明信息
+        :param auto_update: 自动更新到好友中
         """
-        return self.core.add_friend(
+        return self.rate_controls['add_friend'].call(
+            self.core.add_friend,
             userName=get_user_name(user),
             status=2,
             verifyContent=verify_content,
-            autoUpdate=True
+            autoUpdate=auto_update
         )
 
     @handle_response()
@@ -217,7 +309,8 @@ class Robot(object):
 
         # Todo: 验证好友接口可用性，并在接受好友时直接返回新好友
 
-        return self.core.add_friend(
+        return self.rate_controls['add_friend'].call(
+            self.core.add_friend,
             userName=get_user_name(user),
             status=3,
             verifyContent=verify_content,
@@ -247,6 +340,28 @@ class Robot(object):
         else:
             raise ResponseError('Failed to create group:\n{}'.format(pformat(ret)))
 
+    # broadcast
+
+    def broadcast(self, chats, msg=None, image=None, file=None, video=None, workers=4, checkpoint=None):
+        """
+        | 向多个聊天对象发送相同的消息 (群发)，msg, image, file, video 需且仅需指定一项。
+        | 图片、文件和视频仅上传一次，发送以最低的优先级进入发送队列，并受机器人的发送频率限制。
+        | 立即返回一个 :class:`Broadcast` 对象，可迭代获得每个聊天对象完成时的 (聊天对象, 结果)。
+
+        :param chats: 接收消息的聊天对象
+        :param msg: 文本消息
+        :param image: 图片的路径
+        :param file: 文件的路径
+        :param video: 视频的路径
+        :param workers: 同时等待发送的聊天对象的最大数量
+        :param checkpoint: 记录发送进度的文件路径，中断后以相同的路径再次群发，将跳过已发送成功的聊天对象
+        :return: :class:`Broadcast` 对象
+        """
+        return Broadcast(
+            self, chats, msg=msg, image=image, file=file, video=video,
+            workers=workers, checkpoint=checkpoint
+        )
+
     # messages
 
     def _process_message(self, msg):
@@ -257,41 +372,97 @@ class Robot(object):
         if not self.alive:
             return
 
-        func, run_async = self.message_configs.get_func(msg)
+        conf = self.message_configs.match(msg)
 
-        if not func:
+        if not conf:
+            return
+
+        func = conf.func
+
+        if asyncio.iscoroutinefunction(func):
+            asyncio.run_coroutine_threadsafe(self._process_coroutine(conf, msg), self._get_loop())
             return
 
         def process():
             # noinspection PyBroadException
             try:
-                ret = func(msg)
-                if ret is not None:
-                    if isinstance(ret, (tuple, list)):
-                        self.core.send(
-                            msg=str(ret[0]),
-                            toUserName=msg.chat.user_name,
-                            mediaId=ret[1]
-                        )
-                    else:
-                        self.core.send(
-                            msg=str(ret),
-                            toUserName=msg.chat.user_name
-                        )
+                self._reply(msg, func(msg))
             except:
                 logger.warning(
                     'An error occurred in registered function, '
                     'use `Robot().start(debug=True)` to show detailed information')
                 logger.debug(traceback.format_exc())
 
-        if run_async:
-            Thread(target=process).start()
+        if conf.run_async:
+            try:
+                if conf.ordering == PER_CHAT:
+                    self.lanes.submit(msg.get('FromUserName'), process)
+                else:
+                    self.pool.submit(process)
+            except Full:
+                logger.warning('Too many pending messages, dropped: {}'.format(msg))
         else:
             process()
 
+    def _reply(self, msg, ret):
+        """
+        将已注册函数的返回值作为回复，以最高的优先级加入发送队列
+        """
+
+        def log_failure(future):
+            if not future.cancelled() and future.exception():
+                logger.warning('Failed to send reply: {}'.format(future.exception()))
+
+        if ret is not None:
+            # 图片等文件在当前线程中上传后才加入队列，不会占用发送线程
+            if isinstance(ret, (tuple, list)):
+                future = msg.chat.send_nowait(ret[0], ret[1], HIGH)
+            else:
+                future = msg.chat.send_nowait(ret, priority=HIGH)
+            future.add_done_callback(log_failure)
+
+    async def _process_coroutine(self, conf, msg):
+        """
+        在事件循环中执行已注册的协程函数
+        """
+
+        done = previous = None
+        key = msg.get('FromUserName')
+
+        if conf.ordering == PER_CHAT:
+            done = asyncio.Future()
+            previous = self._coroutine_lanes.get(key)
+            self._coroutine_lanes[key] = done
+
+        # noinspection PyBroadException
+        try:
+            if previous:
+                await previous
+            self._reply(msg, await conf.func(msg))
+        except:
+            logger.warning(
+                'An error occurred in registered coroutine function, '
+                'use `Robot().start(debug=True)` to show detailed information')
+            logger.debug(traceback.format_exc())
+        finally:
+            if done:
+                done.set_result(None)
+                if self._coroutine_lanes.get(key) is done:
+                    del self._coroutine_lanes[key]
+
+    def _get_loop(self):
+        """
+        获取执行协程函数的事件循环。若未通过 :meth:`serve` 运行，则在新的线程中创建一个
+        """
+        with self._loop_lock:
+            if not self._loop:
+                self._loop = asyncio.new_event_loop()
+                Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+
     def register(
             self, chats=None, msg_types=None,
-            except_self=True, run_async=True, enabled=True
+            except_self=True, run_async=True, enabled=True, ordering=None
     ):
         """
         装饰器：用于注册消息配置
@@ -301,12 +472,18 @@ class Robot(object):
         :param except_self: 排除自己在手机上发送的消息
         :param run_async: 异步执行配置的函数，可提高响应速度
         :param enabled: 当前配置的默认开启状态，可事后动态开启或关闭
+        :param ordering:
+            | 异步执行时的顺序，为空时不保证顺序
+            | PER_CHAT: 来自同一聊天对象的消息依次处理，不同聊天对象的消息仍并行处理
+
+        被装饰的函数也可以是协程函数 (`async def`)，此时将在事件循环中执行，而不占用工作线程
         """
 
         def register(func):
             self.message_configs.append(MessageConfig(
                 robot=self, func=func, chats=chats, msg_types=msg_types,
-                except_self=except_self, run_async=run_async, enabled=enabled
+                except_self=except_self, run_async=run_async, enabled=enabled,
+                ordering=ordering
             ))
 
             return func
@@ -325,10 +502,7 @@ class Robot(object):
             logger.info('{} Auto-reply started.'.format(self))
             try:
                 while self.alive:
-                    msg = Message(self.core.msgList.get(), self)
-                    if msg.type is not SYSTEM:
-                        self.messages.append(msg)
-                    self._process_message(msg)
+                    self._receive()
             except KeyboardInterrupt:
                 logger.info('KeyboardInterrupt received, ending...')
                 self.alive = False
@@ -341,3 +515,30 @@ class Robot(object):
         else:
             t = Thread(target=listen, daemon=True)
             t.start()
+
+    async def serve(self):
+        """
+        | 协程：在当前的事件循环中开始监听和处理消息
+        | 已注册的协程函数将在这个事件循环中执行，例如::
+
+            asyncio.get_event_loop().run_until_complete(robot.serve())
+
+        """
+
+        loop = asyncio.get_event_loop()
+        with self._loop_lock:
+            self._loop = loop
+
+        logger.info('{} Auto-reply started (asyncio).'.format(self))
+        while self.alive:
+            # 在线程中等待和分派消息，避免阻塞事件循环
+            await loop.run_in_executor(None, self._receive)
+
+    def _receive(self):
+        """
+        接收一条消息，记录并处理
+        """
+        msg = Message(self.core.msgList.get(), self)
+        if msg.type is not SYSTEM:
+            self.messages.append(msg)
+        self._process_message(msg)
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from wxpy.media import upload_media
+from wxpy.utils.constants import PICTURE, ATTACHMENT, VIDEO, LOW
+
+logger = logging.getLogger('wxpy')
+
+
+class Broadcast(object):
+    """
+    | 向多个聊天对象发送相同的消息 (群发)，通常通过 :meth:`Robot.broadcast` 创建。
+    | 创建后立即在后台开始发送，图片、文件和视频仅上传一次。
+    | 消息以最低的优先级 (LOW) 进入机器人的发送队列，因此不会影响自动回复，且发送频率同样受其限制。
+    | 可直接迭代，在每个聊天对象完成发送时获得 (聊天对象, 结果)，失败时结果为对应的异常::
+
+        for chat, ret in robot.broadcast(robot.groups(), file='poster.pdf', checkpoint='poster.log'):
+            print(chat, ret)
+
+    | 指定 `checkpoint` 后，发送成功的聊天对象会被记录到这个文件中。
+    | 若群发被中断，使用相同的 `checkpoint` 再次群发时，将跳过已发送成功的聊天对象。
+    | 由于 user_name 在重新登陆后会变化，此时将尽量以类型和名称识别已发送的聊天对象，但仅限于名称非空，
+    | 且在本次群发的聊天对象和已有记录中都唯一的情况，其余无法确定的聊天对象仍会发送。
+    """
+
+    def __init__(self, robot, chats, msg=None, image=None, file=None, video=None, workers=4, checkpoint=None):
+        """
+        :param robot: 用于发送的机器人
+        :param chats: 接收消息的聊天对象
+        :param msg: 文本消息
+        :param image: 图片的路径
+        :param file: 文件的路径
+        :param video: 视频的路径
+        :param workers: 同时等待发送的聊天对象的最大数量
+        :param checkpoint: 记录发送进度的文件路径，每次群发应使用不同的文件
+        """
+
+        contents = [x for x in (msg, image, file, video) if x is not None]
+        if len(contents) != 1:
+            raise ValueError('exactly one of msg, image, file and video should be given')
+
+        self.robot = robot
+        self.msg = msg
+        self.checkpoint = checkpoint
+
+        if image is not None:
+            self.path, self.media_type, self.func = image, PICTURE, robot.core.send_image
+        elif file is not None:
+            self.path, self.media_type, self.func = file, ATTACHMENT, robot.core.send_file
+        elif video is not None:
+            self.path, self.media_type, self.func = video, VIDEO, robot.core.send_video
+
+        self._lock = threading.Lock()
+
+        done_user_names, done_names = self._load_checkpoint()
+
+        chats = list(chats)
+        target_names = Counter(self._stable_name(chat) for chat in chats)
+
+        #: 根据 `checkpoint` 跳过的聊天对象
+        self.skipped = list()
+        targets = list()
+        for chat in chats:
+            name = self._stable_name(chat)
+            if chat.user_name in done_user_names or (
+                    name and target_names[name] == 1 and len(done_names.get(name, ())) == 1):
+                self.skipped.append(chat)
+            else:
+                targets.append(chat)
+
+        if msg is None and targets:
+            self.media_id = self._upload()
+
+        executor = ThreadPoolExecutor(workers)
+        self._futures = {executor.submit(self._send, chat): chat for chat in targets}
+        executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return '<{}: {} done, {} pending, {} skipped>'.format(
+            self.__class__.__name__, len(self._futures) - self.pending, self.pending, len(self.skipped))
+
+    @property
+    def pending(self):
+        """
+        尚未完成发送的聊天对象数量
+        """
+        return sum(1 for future in self._futures if not future.done())
+
+    @staticmethod
+    def _stable_name(chat):
+        # user_name 在每次登陆后会变化，因此同时以类型和名称识别已发送的聊天对象，无名称时为 None
+        if chat.name:
+            return '{}:{}'.format(chat.__class__.__name__, chat.name)
+
+    def _load_checkpoint(self):
+        user_names = set()
+        # 名称 => 记录中使用这个名称的 user_name 集合，用于判断名称是否唯一
+        names = dict()
+        if self.checkpoint and os.path.isfile(self.checkpoint):
+            with open(self.checkpoint, encoding='utf-8') as fp:
+                for line in fp:
+                    # noinspection PyBroadException
+                    try:
+                        record = json.loads(line)
+                    except:
+                        continue
+                    user_names.add(record.get('user_name'))
+                    if record.get('name'):
+                        names.setdefault(record['name'], set()).add(record.get('user_name'))
+        return user_names, names
+
+    def _record(self, chat):
+        if not self.checkpoint:
+            return
+        line = json.dumps(dict(user_name=chat.user_name, name=self._stable_name(chat)), ensure_ascii=False)
+        with self._lock:
+            with open(self.checkpoint, 'a', encoding='utf-8') as fp:
+                fp.write(line + '\n')
+
+    def _upload(self):
+        media_cache = self.robot.media_cache
+        if media_cache is not None:
+            return media_cache.upload(self.robot, self.path, self.media_type)[0]
+        return upload_media(self.robot, self.path, self.media_type)
+
+    def _send(self, chat):
+        if self.msg is not None:
+            ret = chat._submit(self.robot.core.send_msg, LOW, msg=str(self.msg)).result()
+        elif self.robot.media_cache is not None:
+            ret = self.robot.media_cache.send(chat, self.func, self.path, self.media_type, LOW)
+        else:
+            ret = chat._submit(self.func, LOW, fileDir=self.path, mediaId=self.media_id).result()
+        self._record(chat)
+        return ret
+
+    def __iter__(self):
+        for future in as_completed(self._futures):
+            chat = self._futures[future]
+            try:
+                yield chat, future.result()
+            except Exception as e:
+                logger.warning('failed to broadcast to {}: {}'.format(chat, e))
+                yield chat, e
+
+    def wait(self):
+        """
+        等待所有聊天对象完成发送
+
+        :return: 发送失败的聊天对象及对应的异常，为 (聊天对象, 异常) 的列表
+        """
+        return [(chat, ret) for chat, ret in self if isinstance(ret, Exception)]
@@ -1,3 +1,9 @@
+import asyncio
+from concurrent.futures import Future
+from functools import partial
+
+from wxpy.media import upload_media
+from wxpy.utils.constants import NORMAL, PICTURE, VIDEO, ATTACHMENT
 from wxpy.utils.tools import handle_response
 
 
@@ -6,12 +12,21 @@ class Chat(dict):
     单个用户(:class:`User`)和群聊(:class:`Group`)的基础类
     """
 
-    def __init__(self, response):
-        super(Chat, self).__init__(response)
+    # 常用属性直接读写原始数据，不再复制一份；__dict__ 仅在设置其他属性时才会创建
+    __slots__ = ('robot', '__dict__', '__weakref__')
+
+    #: 与其他聊天对象共享的用户资料，目前仅用于群聊成员，详见 :class:`UserProfiles`
+    profile = None
 
+    def __init__(self, response):
+        self._load(response)
         self.robot = getattr(response, 'robot', None)
-        self.user_name = self.get('UserName')
-        self.nick_name = self.get('NickName')
+
+    def _load(self, raw):
+        """
+        载入原始数据
+        """
+        super(Chat, self).__init__(raw)
 
     @property
     def raw(self):
@@ -20,6 +35,22 @@ class Chat(dict):
         """
         return dict(self)
 
+    @property
+    def user_name(self):
+        return self.get('UserName')
+
+    @user_name.setter
+    def user_name(self, value):
+        self['UserName'] = value
+
+    @property
+    def nick_name(self):
+        return self.get('NickName')
+
+    @nick_name.setter
+    def nick_name(self, value):
+        self['NickName'] = value
+
     @handle_response()
     def send(self, msg, media_id=None):
         """
@@ -32,7 +63,74 @@ class Chat(dict):
             | **内容** 部分可为: 文件、图片、视频的路径，或纯文本的内容
         :param media_id: 填写后可省略上传过程
         """
-        return self.robot.core.send(msg=str(msg), toUserName=self.user_name, mediaId=media_id)
+        msg = str(msg)
+        send_media = {'@img@': self.send_image, '@fil@': self.send_file, '@vid@': self.send_video}.get(msg[:5])
+        if send_media:
+            return send_media(msg[5:], media_id)
+        return self._submit(self.robot.core.send, msg=msg, mediaId=media_id).result()
+
+    def send_nowait(self, msg, media_id=None, priority=NORMAL):
+        """
+        将消息加入机器人的发送队列 (:class:`Outbox`) 后立即返回，不等待发送完成。参数同 :meth:`send`
+
+        :param msg: 消息内容，同 :meth:`send`
+        :param media_id: 填写后可省略上传过程
+        :param priority: 优先级，可为 HIGH, NORMAL, LOW
+        :return: :class:`concurrent.futures.Future` 对象，结果为发送的 :class:`Response`
+        """
+        msg = str(msg)
+        send_media = {
+            '@img@': self.send_image_nowait, '@fil@': self.send_file_nowait, '@vid@': self.send_video_nowait
+        }.get(msg[:5])
+        if send_media:
+            return send_media(msg[5:], media_id, priority)
+        return self._submit(self.robot.core.send, priority, msg=msg, mediaId=media_id)
+
+    def send_image_nowait(self, path, media_id=None, priority=NORMAL):
+        """
+        :meth:`send_image` 的非阻塞版本，参数同 :meth:`send_nowait`
+        """
+        return self._send_media_nowait(self.robot.core.send_image, PICTURE, path, media_id, priority)
+
+    def send_file_nowait(self, path, media_id=None, priority=NORMAL):
+        """
+        :meth:`send_file` 的非阻塞版本，参数同 :meth:`send_nowait`
+        """
+        return self._send_media_nowait(self.robot.core.send_file, ATTACHMENT, path, media_id, priority)
+
+    def send_video_nowait(self, path=None, media_id=None, priority=NORMAL):
+        """
+        :meth:`send_video` 的非阻塞版本，参数同 :meth:`send_nowait`
+        """
+        return self._send_media_nowait(self.robot.core.send_video, VIDEO, path, media_id, priority)
+
+    def _send_media_nowait(self, func, media_type, path, media_id, priority=NORMAL):
+        """
+        | 将图片、文件或视频加入发送队列，未指定 media_id 时使用机器人的 media_id 缓存 (:class:`MediaCache`)。
+        | 需上传的文件在当前线程中上传后才加入队列，避免上传占用发送线程；上传失败时返回的 Future 为对应的异常。
+        """
+        try:
+            if media_id is None and path:
+                if self.robot.media_cache is not None:
+                    return self.robot.media_cache.send_nowait(self, func, path, media_type, priority)
+                media_id = upload_media(self.robot, path, media_type)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+        return self._submit(func, priority, fileDir=path, mediaId=media_id)
+
+    def _send_media(self, func, media_type, path, media_id):
+        """
+        发送图片、文件或视频，并等待发送完成
+        """
+        return self._send_media_nowait(func, media_type, path, media_id).result()
+
+    def _submit(self, func, priority=NORMAL, **kwargs):
+        """
+        通过机器人的发送队列向这个聊天对象发送
+        """
+        return self.robot.outbox.submit(self.user_name, func, priority, toUserName=self.user_name, **kwargs)
 
     @handle_response()
     def send_image(self, path, media_id=None):
@@ -42,7 +140,7 @@ class Chat(dict):
         :param path: 文件路径
         :param media_id: 设置后可省略上传
         """
-        return self.robot.core.send_image(fileDir=path, toUserName=self.user_name, mediaId=media_id)
+        return self._send_media(self.robot.core.send_image, PICTURE, path, media_id)
 
     @handle_response()
     def send_file(self, path, media_id=None):
@@ -52,7 +150,7 @@ class Chat(dict):
         :param path: 文件路径
         :param media_id: 设置后可省略上传
         """
-        return self.robot.core.send_file(fileDir=path, toUserName=self.user_name, mediaId=media_id)
+        return self._send_media(self.robot.core.send_file, ATTACHMENT, path, media_id)
 
     @handle_response()
     def send_video(self, path=None, media_id=None):
@@ -62,7 +160,7 @@ class Chat(dict):
         :param path: 文件路径
         :param media_id: 设置后可省略上传
         """
-        return self.robot.core.send_video(fileDir=path, toUserName=self.user_name, mediaId=media_id)
+        return self._send_media(self.robot.core.send_video, VIDEO, path, media_id)
 
     @handle_response()
     def send_msg(self, msg='Hello WeChat! -- by wxpy'):
@@ -71,7 +169,7 @@ class Chat(dict):
 
         :param msg: 文本内容
         """
-        return self.robot.core.send_msg(msg=str(msg), toUserName=self.user_name)
+        return self._submit(self.robot.core.send_msg, msg=str(msg)).result()
 
     @handle_response()
     def send_raw_msg(self, msg_type, content):
@@ -85,7 +183,50 @@ class Chat(dict):
                 msg.chat.send_raw_msg(msg['MsgType'], msg['Content'])
 
         """
-        return self.robot.core.send_raw_msg(msgType=msg_type, content=content, toUserName=self.user_name)
+        return self._submit(self.robot.core.send_raw_msg, msgType=msg_type, content=content).result()
+
+    def _run_in_executor(self, method, *args, **kwargs):
+        """
+        在机器人的线程池中执行给定的方法，并返回可等待 (awaitable) 的结果
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.robot.executor, partial(method, *args, **kwargs))
+
+    def send_async(self, msg, media_id=None):
+        """
+        :meth:`send` 的可等待版本，需在协程中使用 `await`
+        """
+        return self._run_in_executor(self.send, msg, media_id)
+
+    def send_image_async(self, path, media_id=None):
+        """
+        :meth:`send_image` 的可等待版本，需在协程中使用 `await`
+        """
+        return self._run_in_executor(self.send_image, path, media_id)
+
+    def send_file_async(self, path, media_id=None):
+        """
+        :meth:`send_file` 的可等待版本，需在协程中使用 `await`
+        """
+        return self._run_in_executor(self.send_file, path, media_id)
+
+    def send_video_async(self, path=None, media_id=None):
+        """
+        :meth:`send_video` 的可等待版本，需在协程中使用 `await`
+        """
+        return self._run_in_executor(self.send_video, path, media_id)
+
+    def send_msg_async(self, msg='Hello WeChat! -- by wxpy'):
+        """
+        :meth:`send_msg` 的可等待版本，需在协程中使用 `await`
+        """
+        return self._run_in_executor(self.send_msg, msg)
+
+    def send_raw_msg_async(self, msg_type, content):
+        """
+        :meth:`send_raw_msg` 的可等待版本，需在协程中使用 `await`
+        """
+        return self._run_in_executor(self.send_raw_msg, msg_type, content)
 
     @handle_response()
     def pin(self):
@@ -116,3 +257,143 @@ class Chat(dict):
 
     def __hash__(self):
         return hash((Chat, self.user_name))
+
+
+# 原始数据的键 => 键的位置，由键完全相同的紧凑聊天对象共享
+_schemas = dict()
+
+
+def _get_schema(keys):
+    keys = tuple(keys)
+    schema = _schemas.get(keys)
+    if schema is None:
+        schema = _schemas.setdefault(keys, {key: i for i, key in enumerate(keys)})
+    return schema
+
+
+def _restore_compact(cls, raw):
+    """
+    在反序列化时重建紧凑聊天对象，其余属性随后由 pickle 设置
+    """
+    chat = cls.__new__(cls)
+    CompactChat._load(chat, raw)
+    return chat
+
+
+class CompactChat(object):
+    """
+    | 紧凑聊天对象的混入类，需置于聊天对象类之前，例如 `class CompactFriend(CompactChat, Friend)`。
+    | 原始数据不再以字典保存，而是以值的元组保存，键的位置由所有键相同的对象共享。
+    | 各属性及 `get()`, `[]` 等字典读取方法在访问时才从元组中解码，`raw` 可还原原始的字典。
+    | `update()`, `pop()`, `setdefault()` 等字典修改方法同样作用于元组，`pickle` 也可正常使用。
+    | 但 `json.dumps()` 等直接读取字典内部的代码无法获得这些数据，此时应使用 `raw`。
+    | 子类需声明 `__slots__ = ('_schema', '_values')`
+    """
+
+    __slots__ = ()
+
+    def _load(self, raw):
+        self._schema = _get_schema(raw.keys())
+        self._values = tuple(raw.values())
+
+    @property
+    def raw(self):
+        """
+        原始数据
+        """
+        raw = dict(self.profile or ())
+        raw.update(zip(self._schema, self._values))
+        return raw
+
+    def get(self, key, default=None):
+        i = self._schema.get(key)
+        if i is None:
+            if self.profile is None:
+                return default
+            return self.profile.get(key, default)
+        return self._values[i]
+
+    def __getitem__(self, key):
+        i = self._schema.get(key)
+        if i is None:
+            if self.profile is None:
+                raise KeyError(key)
+            return self.profile[key]
+        return self._values[i]
+
+    def __setitem__(self, key, value):
+        i = self._schema.get(key)
+        if i is None:
+            self._schema = _get_schema(tuple(self._schema) + (key,))
+            self._values += (value,)
+        else:
+            self._values = self._values[:i] + (value,) + self._values[i + 1:]
+
+    def __delitem__(self, key):
+        i = self._schema.get(key)
+        if i is None:
+            # 共享的用户资料为只读
+            raise KeyError(key)
+        keys = tuple(self._schema)
+        self._schema = _get_schema(keys[:i] + keys[i + 1:])
+        self._values = self._values[:i] + self._values[i + 1:]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        if key not in self._schema:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self):
+        if not self._schema:
+            raise KeyError('popitem(): dictionary is empty')
+        key = tuple(self._schema)[-1]
+        return key, self.pop(key)
+
+    def clear(self):
+        self._schema = _get_schema(())
+        self._values = ()
+
+    def __reduce__(self):
+        # 元组以外的属性 (例如 robot, group, profile) 作为状态，由 pickle 逐个设置
+        state = dict()
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name not in ('_schema', '_values', '__dict__', '__weakref__') and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        state.update(getattr(self, '__dict__', dict()))
+        return _restore_compact, (type(self), dict(zip(self._schema, self._values))), (None, state)
+
+    def __contains__(self, key):
+        return key in self._schema or (self.profile is not None and key in self.profile)
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def keys(self):
+        return self.raw.keys()
+
+    def values(self):
+        return self.raw.values()
+
+    def items(self):
+        return self.raw.items()
+
+    def copy(self):
+        return self.raw
@@ -1,11 +1,12 @@
 import logging
 
 import time
-from collections import Counter
 
 from wxpy.group import Group
-from wxpy.utils.constants import MALE, FEMALE
-from wxpy.utils.tools import ensure_list, match_name
+from wxpy.utils.columns import Columns
+from wxpy.utils.constants import MALE, FEMALE, NAME_ATTRIBUTES
+from wxpy.utils.indexes import NameIndex, SimilarityIndex
+from wxpy.utils.tools import ensure_list, match_name, name_text
 
 
 class Chats(list):
@@ -13,14 +14,164 @@ class Chats(list):
     多个聊天对象的合集，可用于搜索或统计
     """
 
-    def __init__(self, chat_list=None, source=None):
+    #: 搜索时建立哈希索引的属性，通常为取值较少的属性
+    indexed_attributes = ('sex', 'province', 'city')
+
+    # pickle 会在恢复实例属性之前调用 extend()，因此版本号需有类级别的默认值
+    _version = 0
+
+    def __init__(self, chat_list=None, source=None, name_index=None):
         if chat_list:
             super(Chats, self).__init__(chat_list)
         self.source = source
 
+        #: 以 user_name 为键的名称索引，存在时搜索名称将不再逐个比对
+        self.name_index = name_index
+
+        # 以下索引在首次使用时建立，合集的内容发生变化 (包括排序) 时重建
+        self._version = 0
+        self._indexed_version = None
+        # 可能包含以下内容，通过 copy() 得到的副本在发生变化前与原合集共用:
+        # 'positions': user_name => 位置列表，用于将名称索引的结果映射回合集中的对象
+        # 'attributes': 属性名 => {属性值 => 位置集合}
+        # 'similarity': 以位置为键的名称相似度索引
+        # 'columns': 用于统计的列式快照
+        self._indexes = None
+
     def __add__(self, other):
         return Chats(super(Chats, self).__add__(other or list()))
 
+    def copy(self):
+        """
+        合集的浅拷贝，在任何一方发生变化前，与原合集共用已建立的索引
+
+        :return: 新的合集
+        """
+        self._check_indexes()
+        copied = Chats(self, self.source, self.name_index)
+        copied._indexed_version = copied._version
+        copied._indexes = self._indexes
+        return copied
+
+    def _changed(self, added=False):
+        """
+        使基于位置的索引失效；若加入了新的聊天对象，名称索引中没有它们，因此同时丢弃名称索引
+        """
+        self._version += 1
+        if added:
+            self.name_index = None
+
+    def __setitem__(self, key, value):
+        super(Chats, self).__setitem__(key, value)
+        self._changed(added=True)
+
+    def __delitem__(self, key):
+        super(Chats, self).__delitem__(key)
+        self._changed()
+
+    def __iadd__(self, other):
+        self._changed(added=True)
+        return super(Chats, self).__iadd__(other)
+
+    def __imul__(self, other):
+        self._changed()
+        return super(Chats, self).__imul__(other)
+
+    def append(self, chat):
+        super(Chats, self).append(chat)
+        self._changed(added=True)
+
+    def extend(self, chats):
+        super(Chats, self).extend(chats)
+        self._changed(added=True)
+
+    def insert(self, index, chat):
+        super(Chats, self).insert(index, chat)
+        self._changed(added=True)
+
+    def remove(self, chat):
+        super(Chats, self).remove(chat)
+        self._changed()
+
+    def pop(self, index=-1):
+        self._changed()
+        return super(Chats, self).pop(index)
+
+    def clear(self):
+        super(Chats, self).clear()
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        self._changed()
+        super(Chats, self).sort(*args, **kwargs)
+
+    def reverse(self):
+        super(Chats, self).reverse()
+        self._changed()
+
+    def build_name_index(self):
+        """
+        为合集建立名称索引，此后的名称搜索将直接使用索引。
+        向合集中加入聊天对象后，名称索引会被丢弃，需重新建立。
+
+        :return: 建立的名称索引
+        """
+        index = NameIndex()
+        for chat in self:
+            index.add(chat.user_name, name_text(chat))
+        self.name_index = index
+        return index
+
+    def _check_indexes(self):
+        if self._indexed_version != self._version:
+            self._indexed_version = self._version
+            self._indexes = dict()
+        return self._indexes
+
+    def _search_name_index(self, name):
+        """
+        通过名称索引找到名称匹配的聊天对象
+
+        :return: 匹配的位置集合
+        """
+
+        indexes = self._check_indexes()
+        positions = indexes.get('positions')
+        if positions is None:
+            positions = dict()
+            for i, chat in enumerate(self):
+                positions.setdefault(chat.user_name, list()).append(i)
+            indexes['positions'] = positions
+
+        found = set()
+        for user_name in self.name_index.search(name):
+            found.update(positions.get(user_name, ()))
+        return found
+
+    def _search_attribute_index(self, attr, value):
+        """
+        通过属性的哈希索引找到属性值相等的聊天对象
+
+        :return: 匹配的位置集合，若属性值无法用于索引，则为 None
+        """
+
+        attribute_indexes = self._check_indexes().setdefault('attributes', dict())
+        index = attribute_indexes.get(attr)
+        if index is None:
+            index = dict()
+            for i, chat in enumerate(self):
+                key = getattr(chat, attr, None) or chat.get(attr)
+                try:
+                    index.setdefault(key, set()).add(i)
+                except TypeError:
+                    return
+            attribute_indexes[attr] = index
+
+        try:
+            return index.get(value, set())
+        except TypeError:
+            return
+
     def search(self, name=None, **attributes):
         """
         在合集中进行搜索
@@ -38,9 +189,72 @@ class Chats(list):
                     return
             return True
 
+        # 先通过索引得到候选的位置集合，再从最小的集合开始求交集，其余的条件仅在候选中逐个比对
+        attributes = dict(attributes)
+        found = list()
+
+        if name and self.name_index is not None:
+            found.append(self._search_name_index(name))
+            name = None
+
+        for attr in self.indexed_attributes:
+            if attr in attributes:
+                positions = self._search_attribute_index(attr, attributes[attr])
+                if positions is not None:
+                    found.append(positions)
+                    del attributes[attr]
+
+        if found:
+            found.sort(key=len)
+            positions = set(found[0])
+            for other in found[1:]:
+                if not positions:
+                    break
+                positions &= other
+            candidates = [self[i] for i in sorted(positions)]
+        else:
+            candidates = self
+
         if name:
             name = name.lower()
-        return Chats(filter(match, self), self.source)
+        return Chats(filter(match, candidates), self.source)
+
+    def search_ranked(self, query, k=10):
+        """
+        按名称的相似度进行模糊搜索，返回最相关的 k 个聊天对象
+
+        | 与 :meth:`search` 不同，名称中存在错别字时也能找到，且结果按相关度排序::
+
+            # 找到名称最接近 "张三丰" 的 5 位好友
+            robot.friends().search_ranked('张三丰', 5)
+
+        | 首次搜索时会为合集建立相似度索引，合集的内容发生变化时重建。
+
+        :param query: 名称 (可以是昵称、备注等)
+        :param k: 最多返回的数量
+        :return: 匹配的聊天对象合集，按相关度从高到低排列
+        """
+
+        indexes = self._check_indexes()
+        index = indexes.get('similarity')
+        if index is None:
+            index = SimilarityIndex()
+            for i, chat in enumerate(self):
+                index.add(i, (getattr(chat, attr, None) or '' for attr in NAME_ATTRIBUTES))
+            indexes['similarity'] = index
+
+        return Chats([self[i] for i, _ in index.top(query, k)], self.source)
+
+    def columns(self):
+        """
+        合集的列式快照 (:class:`Columns`)，在合集的内容发生变化前，总是返回同一个快照
+
+        :return: 列式快照
+        """
+        indexes = self._check_indexes()
+        if 'columns' not in indexes:
+            indexes['columns'] = Columns(self)
+        return indexes['columns']
 
     def stats(self, attribs=('sex', 'province', 'city')):
         """
@@ -50,15 +264,25 @@ class Chats(list):
         :return: 统计结果
         """
 
-        def attr_stat(objects, attr_name):
-            return Counter(list(map(lambda x: getattr(x, attr_name), objects)))
-
+        columns = self.columns()
         attribs = ensure_list(attribs)
         ret = dict()
         for attr in attribs:
-            ret[attr] = attr_stat(self, attr)
+            ret[attr] = columns.counts(attr)
         return ret
 
+    def group_stats(self, attribs=('province', 'sex')):
+        """
+        统计多个属性的组合的分布情况，例如各省份的男女数量::
+
+            robot.friends().group_stats(('province', 'sex'))
+            # Counter({('广东', 1): 40, ('广东', 2): 12, ...})
+
+        :param attribs: 需统计的属性列表或元组
+        :return: 以属性值的元组为键的统计结果
+        """
+        return self.columns().group_counts(ensure_list(attribs))
+
     def stats_text(self, total=True, sex=True, top_provinces=10, top_cities=10):
         """
         简单的统计结果的文本
@@ -71,11 +295,11 @@ class Chats(list):
         """
 
         def top_n_text(attr, n):
-            top_n = list(filter(lambda x: x[0], stats[attr].most_common()))[:n]
+            top_n = self.columns().top(attr, n)
             top_n = ['{}: {} ({:.2%})'.format(k, v, v / len(self)) for k, v in top_n]
             return '\n'.join(top_n)
 
-        stats = self.stats()
+        stats = self.stats('sex')
 
         text = str()
 
@@ -123,11 +347,12 @@ class Chats(list):
 
         return text
 
-    def add_all(self, interval=1, verify_content='', auto_update=True):
+    def add_all(self, interval=None, verify_content='', auto_update=True):
         """
-        将合集中的所有用户加为好友，请小心应对调用频率限制！
+        将合集中的所有用户加为好友。
+        添加的频率由机器人的频率控制器 (`robot.rate_controls['add_friend']`) 自动调整，通常无需设置间隔。
 
-        :param interval: 间隔时间(秒)
+        :param interval: 额外的间隔时间(秒)
         :param verify_content: 验证说明文本
         :param auto_update: 自动更新到好友中
         :return:
@@ -136,5 +361,6 @@ class Chats(list):
             logging.info('Adding {}'.format(user.name))
             ret = user.add(verify_content, auto_update)
             logging.info(ret)
-            logging.info('Waiting for {} seconds'.format(interval))
-            time.sleep(interval)
+            if interval:
+                logging.info('Waiting for {} seconds'.format(interval))
+                time.sleep(interval)
@@ -1,3 +1,4 @@
+from wxpy.chat import CompactChat
 from wxpy.user import User
 
 
@@ -6,4 +7,12 @@ class Friend(User):
     好友对象
     """
 
-    pass
+    __slots__ = ()
+
+
+class CompactFriend(CompactChat, Friend):
+    """
+    紧凑的好友对象，详见 :class:`CompactChat`
+    """
+
+    __slots__ = ('_schema', '_values')
@@ -1,7 +1,7 @@
 import logging
 
-from wxpy.chat import Chat
-from wxpy.member import Member
+from wxpy.chat import Chat, CompactChat
+from wxpy.member import Member, CompactMember
 from wxpy.utils.tools import wrap_user_name, ensure_list, handle_response, get_user_name
 
 
@@ -10,14 +10,22 @@ class Group(Chat):
     群聊对象
     """
 
+    __slots__ = ('_members', '_member_index')
+
+    #: 群聊成员所使用的类
+    member_class = Member
+
     def __init__(self, response):
         super(Group, self).__init__(response)
         from wxpy.chats import Chats
         self._members = Chats(source=self)
+        # user_name => Member，随成员列表一同重建
+        self._member_index = dict()
         for raw in self.get('MemberList', list()):
-            member = Member(raw, self)
+            member = self.member_class(raw, self)
             member.robot = self.robot
             self._members.append(member)
+            self._member_index.setdefault(member.user_name, member)
 
     @property
     def members(self):
@@ -28,11 +36,19 @@ class Group(Chat):
             self.update_group()
         return self._members
 
+    def get_member(self, user):
+        """
+        根据用户对象或 user_name 获取群聊中的对应成员
+
+        :param user: 用户对象或 user_name
+        :return: 对应的群聊成员，若不在群聊中则为 None
+        """
+        if not self.members:
+            return
+        return self._member_index.get(get_user_name(user))
+
     def __contains__(self, user):
-        user = wrap_user_name(user)
-        for member in self.members:
-            if member == user:
-                return member
+        return self.get_member(user) is not None
 
     def __iter__(self):
         for member in self.members:
@@ -55,7 +71,10 @@ class Group(Chat):
         :param attributes: 属性键值对
         :return: 匹配的群聊成员
         """
-        return self.members.search(name, **attributes)
+        members = self.members
+        if name and members.name_index is None:
+            members.build_name_index()
+        return members.search(name, **attributes)
 
     @property
     def owner(self):
@@ -64,9 +83,7 @@ class Group(Chat):
         """
         owner_user_name = self.get('ChatRoomOwner')
         if owner_user_name:
-            for member in self:
-                if member.user_name == owner_user_name:
-                    return member
+            return self.get_member(owner_user_name)
         elif self.members:
             return self[0]
 
@@ -89,6 +106,7 @@ class Group(Chat):
             return self.robot.core.update_chatroom(self.user_name, members_details)
 
         self.__init__(do())
+        self.robot.registry.adopt(self)
 
     @handle_response()
     def add_members(self, users, use_invitation=False):
@@ -99,7 +117,8 @@ class Group(Chat):
         :param use_invitation: 使用发送邀请的方式
         """
 
-        return self.robot.core.add_member_into_chatroom(
+        return self.robot.rate_controls['add_members'].call(
+            self.robot.core.add_member_into_chatroom,
             self.user_name,
             ensure_list(wrap_user_name(users)),
             use_invitation
@@ -150,3 +169,25 @@ class Group(Chat):
         ret = do()
         self.update_group()
         return ret
+
+
+class CompactGroup(CompactChat, Group):
+    """
+    紧凑的群聊对象，其成员为 :class:`CompactMember`，详见 :class:`CompactChat`
+    """
+
+    __slots__ = ('_schema', '_values')
+
+    member_class = CompactMember
+
+    # 与 Group 一样，以下方法作用于群聊成员，而非原始数据
+
+    def __getitem__(self, x):
+        if isinstance(x, (int, slice)):
+            return self.members.__getitem__(x)
+        else:
+            return CompactChat.__getitem__(self, x)
+
+    __contains__ = Group.__contains__
+    __iter__ = Group.__iter__
+    __len__ = Group.__len__
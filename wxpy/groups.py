@@ -6,16 +6,19 @@ class Groups(list):
     群聊的合集，可用于按条件搜索
     """
 
-    def __init__(self, group_list=None):
+    def __init__(self, group_list=None, memberships=None):
         if group_list:
             super(Groups, self).__init__(group_list)
 
+        #: 群成员的反向索引 (通常为 :class:`ChatRegistry`)，存在时按用户搜索将直接使用索引，不会更新群聊
+        self.memberships = memberships
+
     def search(self, name=None, users=None, **attributes):
         """
         根据给定的条件搜索合集中的群聊
 
         :param name: 群聊名称
-        :param users: 需包含的用户
+        :param users: 需包含的用户 (列表)
         :param attributes: 属性键值对，键可以是 owner(群主对象), is_owner(自身是否为群主), nick_name(精准名称) 等。
         :return: 匹配条件的群聊列表
         """
@@ -23,7 +26,10 @@ class Groups(list):
         def match(group):
             if not match_name(group, name):
                 return
-            if users:
+            if group_names is not None:
+                if group.user_name not in group_names:
+                    return
+            elif users:
                 for user in users:
                     if user not in group:
                         return
@@ -32,5 +38,9 @@ class Groups(list):
                     return
             return True
 
-        return Groups(filter(match, self))
+        group_names = None
+        if users and self.memberships is not None:
+            group_names = self.memberships.group_names_of(users)
+
+        return Groups(filter(match, self), self.memberships)
 
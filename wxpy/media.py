@@ -0,0 +1,245 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from wxpy.response import Response, ResponseError
+from wxpy.utils.caches import TTLCache
+from wxpy.utils.constants import PICTURE, VIDEO, NORMAL
+
+logger = logging.getLogger('wxpy')
+
+
+def file_digest(path):
+    """
+    计算文件内容的 SHA-256 摘要
+
+    :param path: 文件路径
+    :return: 十六进制的摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upload_media(robot, path, media_type):
+    """
+    上传文件 (不使用缓存)
+
+    :param robot: 用于上传的机器人
+    :param path: 文件路径
+    :param media_type: 文件类型，可为 PICTURE, VIDEO, ATTACHMENT
+    :return: 文件的 media_id
+    """
+    return Response(robot.core.upload_file(
+        path, isPicture=media_type == PICTURE, isVideo=media_type == VIDEO
+    ), robot).get('MediaId')
+
+
+def chain_future(source, target):
+    """
+    在 source 完成时，将其结果或异常传递给 target
+
+    :param source: 来源的 :class:`concurrent.futures.Future`
+    :param target: 目标的 :class:`concurrent.futures.Future`
+    """
+
+    def copy(future):
+        if future.cancelled():
+            target.cancel()
+        elif future.exception() is not None:
+            target.set_exception(future.exception())
+        else:
+            target.set_result(future.result())
+
+    source.add_done_callback(copy)
+
+
+class MediaCache(TTLCache):
+    """
+    | 已上传文件的 media_id 缓存，以文件类型和内容的摘要为键。
+    | 发送图片、文件和视频时会自动使用缓存中的 media_id，因此相同的文件只需上传一次；
+    | 若服务器以 `retry_codes` 中的返回值拒绝了缓存的 media_id (通常是已过期)，则会重新上传。
+    | 指定 `path` 后，缓存会保存到文件中，重启后仍然有效::
+
+        robot.media_cache = MediaCache('wxpy_media.json')
+    """
+
+    #: 表示 media_id 被拒绝、需重新上传的返回值，为 None 时除过于频繁以外的所有错误都会重新上传
+    retry_codes = None
+
+    def __init__(self, path=None, ttl=86400, max_size=1000):
+        """
+        :param path: 保存缓存的文件路径，为空时不保存
+        :param ttl: media_id 的有效时间(秒)，应不长于服务器保留文件的时间
+        :param max_size: 最多保存的 media_id 数量，超出时淘汰最久未使用的
+        """
+        super(MediaCache, self).__init__(ttl, max_size)
+        self.path = path
+
+        # (文件路径, 大小, 修改时间) => 内容的摘要，避免重复计算未修改的文件
+        self._digests = TTLCache(None, max_size)
+        # 键 => [锁, 使用者的数量]，避免同时上传相同的文件，没有使用者时移除
+        self._upload_locks = dict()
+        self._upload_locks_lock = threading.Lock()
+
+        if path and os.path.isfile(path):
+            self.load()
+
+    def __repr__(self):
+        return '<{}: {} media>'.format(self.__class__.__name__, len(self))
+
+    def key(self, path, media_type):
+        """
+        获取文件所对应的键
+
+        :param path: 文件路径
+        :param media_type: 文件类型，可为 PICTURE, VIDEO, ATTACHMENT
+        """
+        stat = os.stat(path)
+        stat_key = os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+        digest = self._digests.get(stat_key)
+        if digest is None:
+            digest = file_digest(path)
+            self._digests.set(stat_key, digest)
+        return '{}:{}'.format(media_type, digest)
+
+    def set(self, key, value, ttl=None):
+        super(MediaCache, self).set(key, value, ttl)
+        self.save()
+
+    def pop(self, key, default=None):
+        value = super(MediaCache, self).pop(key, default)
+        self.save()
+        return value
+
+    def load(self):
+        """
+        从文件中载入未过期的 media_id
+        """
+        # noinspection PyBroadException
+        try:
+            with open(self.path, encoding='utf-8') as fp:
+                items = json.load(fp)
+        except:
+            logger.warning('failed to load media cache from {}'.format(self.path))
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, value, expires in items:
+                if expires is None or expires > now:
+                    self._items[key] = value, expires
+
+    def save(self):
+        """
+        将缓存保存到文件中
+        """
+        if not self.path:
+            return
+        with self._lock:
+            items = [[key, value, expires] for key, (value, expires) in self._items.items()]
+        temp = '{}.{}.tmp'.format(self.path, threading.get_ident())
+        with open(temp, 'w', encoding='utf-8') as fp:
+            json.dump(items, fp)
+        os.replace(temp, self.path)
+
+    @contextmanager
+    def _upload_lock(self, key):
+        with self._upload_locks_lock:
+            entry = self._upload_locks.get(key)
+            if entry is None:
+                entry = self._upload_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._upload_locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._upload_locks[key]
+
+    def upload(self, robot, path, media_type, stale=None):
+        """
+        获取文件的 media_id，仅在缓存中没有时上传
+
+        :param robot: 用于上传的机器人
+        :param path: 文件路径
+        :param media_type: 文件类型，可为 PICTURE, VIDEO, ATTACHMENT
+        :param stale: 已被服务器拒绝的 media_id，缓存中的 media_id 与之相同时将重新上传
+        :return: (media_id, 是否来自缓存)
+        """
+
+        key = self.key(path, media_type)
+
+        with self._upload_lock(key):
+            media_id = self.get(key)
+            if media_id and media_id != stale:
+                return media_id, True
+
+            media_id = upload_media(robot, path, media_type)
+            if media_id:
+                self.set(key, media_id)
+            return media_id, False
+
+    def _should_retry(self, e):
+        """
+        发送失败的异常是否表示 media_id 被拒绝
+        """
+        if self.retry_codes is None:
+            return not e.throttled
+        return e.err_code in self.retry_codes
+
+    def send(self, chat, func, path, media_type, priority=NORMAL):
+        """
+        使用缓存的 media_id 发送文件，若 media_id 被服务器拒绝，则重新上传后再次发送
+
+        :param chat: 接收文件的聊天对象
+        :param func: itchat 的发送方法，例如 `robot.core.send_image`
+        :param path: 文件路径
+        :param media_type: 文件类型，可为 PICTURE, VIDEO, ATTACHMENT
+        :param priority: 发送的优先级，可为 HIGH, NORMAL, LOW
+        :return: 发送的 :class:`Response`
+        """
+        return self.send_nowait(chat, func, path, media_type, priority).result()
+
+    def send_nowait(self, chat, func, path, media_type, priority=NORMAL):
+        """
+        :meth:`send` 的非阻塞版本。文件在当前线程中上传 (或从缓存中获取) 后加入发送队列，立即返回。
+        若缓存的 media_id 被服务器拒绝，将在机器人的线程池中重新上传并发送，不会占用发送线程。
+
+        :return: :class:`concurrent.futures.Future` 对象，结果为发送的 :class:`Response`
+        """
+
+        media_id, cached = self.upload(chat.robot, path, media_type)
+        future = chat._submit(func, priority, fileDir=path, mediaId=media_id)
+        if not cached:
+            return future
+
+        def resend():
+            new_media_id, _ = self.upload(chat.robot, path, media_type, stale=media_id)
+            chain_future(chat._submit(func, priority, fileDir=path, mediaId=new_media_id), result)
+
+        def check(sent):
+            e = None if sent.cancelled() else sent.exception()
+            if isinstance(e, ResponseError) and self._should_retry(e):
+                logger.info('cached media_id rejected (code: {}), uploading again: {}'.format(e.err_code, path))
+                retry = chat.robot.executor.submit(resend)
+                retry.add_done_callback(lambda f: f.exception() is not None and result.set_exception(f.exception()))
+            elif sent.cancelled():
+                result.cancel()
+            elif e is not None:
+                result.set_exception(e)
+            else:
+                result.set_result(sent.result())
+
+        result = Future()
+        future.add_done_callback(check)
+        return result
@@ -1,3 +1,4 @@
+from wxpy.chat import CompactChat
 from wxpy.user import User
 
 
@@ -6,6 +7,62 @@ class Member(User):
     群聊成员对象
     """
 
+    __slots__ = ('group', 'profile')
+
     def __init__(self, raw, group):
+        # 若所属的机器人维护了用户资料，则共享资料，自身仅保存与群聊相关的字段
+        profiles = getattr(getattr(group, 'robot', None), 'profiles', None)
+        if profiles is None:
+            self.profile = None
+        else:
+            self.profile, raw = profiles.split(raw)
         super().__init__(raw)
         self.group = group
+
+    @property
+    def raw(self):
+        """
+        原始数据
+        """
+        raw = dict(self.profile or ())
+        raw.update(dict.items(self))
+        return raw
+
+    def get(self, key, default=None):
+        if self.profile is None or dict.__contains__(self, key):
+            return dict.get(self, key, default)
+        return self.profile.get(key, default)
+
+    def __getitem__(self, key):
+        if self.profile is None or dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        return self.profile[key]
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (self.profile is not None and key in self.profile)
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def keys(self):
+        return self.raw.keys()
+
+    def values(self):
+        return self.raw.values()
+
+    def items(self):
+        return self.raw.items()
+
+    def copy(self):
+        return self.raw
+
+
+class CompactMember(CompactChat, Member):
+    """
+    紧凑的群聊成员对象，详见 :class:`CompactChat`
+    """
+
+    __slots__ = ('_schema', '_values')
@@ -1,13 +1,18 @@
 import datetime
 import logging
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import islice
 
 from wxpy.chat import Chat
 from wxpy.chats import Chats
 from wxpy.group import Group
 from wxpy.member import Member
 from wxpy.user import User
-from wxpy.utils.constants import MAP, CARD, FRIENDS, SYSTEM
-from wxpy.utils.tools import ensure_list, wrap_user_name, match_name
+from wxpy.utils.constants import MAP, CARD, FRIENDS, SYSTEM, HIGH
+from wxpy.utils.indexes import NgramIndex
+from wxpy.utils.tools import ensure_list, wrap_user_name, get_user_name, cached_property
 from xml.etree import ElementTree as ETree
 
 
@@ -18,7 +23,7 @@ class MessageConfig(object):
 
     def __init__(
             self, robot, func, chats, msg_types,
-            except_self, run_async, enabled
+            except_self, run_async, enabled, ordering=None
     ):
         self.robot = robot
         self.func = func
@@ -27,6 +32,7 @@ class MessageConfig(object):
         self.msg_types = ensure_list(msg_types)
         self.except_self = except_self
         self.run_async = run_async
+        self.ordering = ordering
 
         self._enabled = None
         self.enabled = enabled
@@ -38,6 +44,9 @@ class MessageConfig(object):
     @enabled.setter
     def enabled(self, value):
         self._enabled = value
+        configs = getattr(self.robot, 'message_configs', None)
+        if configs is not None:
+            configs.invalidate()
         logging.info(self.__repr__())
 
     def __repr__(self):
@@ -63,6 +72,91 @@ class MessageConfigs(list):
         """
         super(MessageConfigs, self).__init__()
         self.robot = robot
+        self._index = None
+
+    def invalidate(self):
+        """
+        标记分派索引已过期，将在下次匹配消息时重建
+        """
+        self._index = None
+
+    def append(self, conf):
+        super(MessageConfigs, self).append(conf)
+        self.invalidate()
+
+    def extend(self, confs):
+        super(MessageConfigs, self).extend(confs)
+        self.invalidate()
+
+    def insert(self, i, conf):
+        super(MessageConfigs, self).insert(i, conf)
+        self.invalidate()
+
+    def remove(self, conf):
+        super(MessageConfigs, self).remove(conf)
+        self.invalidate()
+
+    def __delitem__(self, i):
+        super(MessageConfigs, self).__delitem__(i)
+        self.invalidate()
+
+    def __setitem__(self, i, conf):
+        super(MessageConfigs, self).__setitem__(i, conf)
+        self.invalidate()
+
+    def __iadd__(self, confs):
+        result = super(MessageConfigs, self).__iadd__(confs)
+        self.invalidate()
+        return result
+
+    def __imul__(self, n):
+        result = super(MessageConfigs, self).__imul__(n)
+        self.invalidate()
+        return result
+
+    def pop(self, i=-1):
+        conf = super(MessageConfigs, self).pop(i)
+        self.invalidate()
+        return conf
+
+    def clear(self):
+        super(MessageConfigs, self).clear()
+        self.invalidate()
+
+    def sort(self, *args, **kwargs):
+        super(MessageConfigs, self).sort(*args, **kwargs)
+        self.invalidate()
+
+    def reverse(self):
+        super(MessageConfigs, self).reverse()
+        self.invalidate()
+
+    def _build_index(self):
+        """
+        | 将处于开启状态的配置编译为分派索引:
+        | 消息类型 => (所有聊天对象的配置, user_name => 配置, 聊天对象类 => 配置)
+        | 未指定消息类型的配置以 None 为键。每个配置均附带其注册顺序，用于确定优先级。
+        """
+
+        index = dict()
+
+        for order, conf in enumerate(self):
+            if not conf.enabled:
+                continue
+            for msg_type in conf.msg_types or [None]:
+                any_chat, by_user_name, by_class = index.setdefault(msg_type, (list(), dict(), dict()))
+                entry = order, conf
+                if not conf.chats:
+                    any_chat.append(entry)
+                    continue
+                for chat in conf.chats:
+                    if isinstance(chat, type):
+                        by_class.setdefault(chat, list()).append(entry)
+                    else:
+                        by_user_name.setdefault(get_user_name(chat), list()).append(entry)
+
+        self._index = index
+        return index
 
     def get_func(self, msg):
         """
@@ -72,30 +166,54 @@ class MessageConfigs(list):
         :return: 回复函数 func，及是否异步执行 run_async
         """
 
-        def ret(_conf=None):
-            if _conf:
-                return _conf.func, _conf.run_async
-            else:
-                return None, None
+        conf = self.match(msg)
+        if conf:
+            return conf.func, conf.run_async
+        else:
+            return None, None
 
-        for conf in self[::-1]:
+    def match(self, msg):
+        """
+        获取给定消息所匹配的配置，匹配规则同 :meth:`get_func`
 
-            if not conf.enabled or (conf.except_self and msg.chat == self.robot.self):
-                return ret()
+        :param msg: 给定的消息
+        :return: 匹配的配置，若无匹配则为 None
+        """
 
-            if conf.msg_types and msg.type not in conf.msg_types:
-                continue
-            elif not conf.msg_types and msg.type == SYSTEM:
-                continue
+        index = self._index
+        if index is None:
+            index = self._build_index()
 
-            if not conf.chats:
-                return ret(conf)
+        chat = msg.chat
+        user_name = getattr(chat, 'user_name', None)
+        is_self = chat == self.robot.self
 
-            for chat in conf.chats:
-                if chat == msg.chat or (isinstance(chat, type) and isinstance(msg.chat, chat)):
-                    return ret(conf)
+        msg_types = [msg.type]
+        if msg.type != SYSTEM:
+            msg_types.append(None)
 
-        return ret()
+        best = None
+
+        for msg_type in msg_types:
+            if msg_type not in index:
+                continue
+            any_chat, by_user_name, by_class = index[msg_type]
+            candidates = [any_chat, by_user_name.get(user_name)]
+            candidates.extend(map(by_class.get, type(chat).__mro__))
+
+            for entries in candidates:
+                if not entries:
+                    continue
+                for order, conf in reversed(entries):
+                    if best and order <= best[0]:
+                        break
+                    if conf.except_self and is_self:
+                        continue
+                    best = order, conf
+                    break
+
+        if best:
+            return best[1]
 
     def get_config(self, func):
         """
@@ -165,54 +283,136 @@ class Message(dict):
     def __init__(self, raw, robot):
         super(Message, self).__init__(raw)
 
+        # 其他属性均在首次访问时才解析，以降低构造消息的开销
         self.robot = robot
         self.type = self.get('Type')
 
-        self.is_at = self.get('isAt')
-        self.file_name = self.get('FileName')
-        self.img_height = self.get('ImgHeight')
-        self.img_width = self.get('ImgWidth')
-        self.play_length = self.get('PlayLength')
-        self.url = self.get('Url')
-        self.voice_length = self.get('VoiceLength')
-        self.id = self.get('NewMsgId')
-
-        self.text = None
-        self.get_file = None
-        self.create_time = None
-        self.location = None
-        self.card = None
+    @property
+    def is_at(self):
+        return self.get('isAt')
 
+    @property
+    def file_name(self):
+        return self.get('FileName')
+
+    @property
+    def img_height(self):
+        return self.get('ImgHeight')
+
+    @property
+    def img_width(self):
+        return self.get('ImgWidth')
+
+    @property
+    def play_length(self):
+        return self.get('PlayLength')
+
+    @property
+    def url(self):
+        return self.get('Url')
+
+    @property
+    def voice_length(self):
+        return self.get('VoiceLength')
+
+    @property
+    def id(self):
+        return self.get('NewMsgId')
+
+    @cached_property
+    def text(self):
+        if self.type == MAP:
+            if self.location:
+                return self.location.get('label')
+        elif self.type in (CARD, FRIENDS):
+            return self.card.get('Content')
+        text = self.get('Text')
+        if not callable(text):
+            return text
+
+    @cached_property
+    def get_file(self):
         text = self.get('Text')
         if callable(text):
-            self.get_file = text
-        else:
-            self.text = text
+            return text
 
+    @cached_property
+    def create_time(self):
         create_time = self.get('CreateTime')
         if isinstance(create_time, int):
-            self.create_time = datetime.datetime.fromtimestamp(create_time)
+            return datetime.datetime.fromtimestamp(create_time)
 
+    @cached_property
+    def location(self):
         if self.type == MAP:
             try:
-                self.location = ETree.fromstring(self['OriContent']).find('location').attrib
+                location = ETree.fromstring(self['OriContent']).find('location').attrib
                 try:
-                    self.location['x'] = float(self.location['x'])
-                    self.location['y'] = float(self.location['y'])
-                    self.location['scale'] = int(self.location['scale'])
-                    self.location['maptype'] = int(self.location['maptype'])
+                    location['x'] = float(location['x'])
+                    location['y'] = float(location['y'])
+                    location['scale'] = int(location['scale'])
+                    location['maptype'] = int(location['maptype'])
                 except (KeyError, ValueError):
                     pass
-                self.text = self.location.get('label')
-            except (TypeError, KeyError, ValueError, ETree.ParseError):
+                return location
+            except (TypeError, KeyError, ValueError, AttributeError, ETree.ParseError):
                 pass
-        elif self.type in (CARD, FRIENDS):
-            self.card = User(self.get('RecommendInfo'))
-            self.text = self.card.get('Content')
 
-        # 将 msg.chat.send* 方法绑定到 msg.reply*，例如 msg.chat.send_img => msg.reply_img
-        for method in '', '_image', '_file', '_video', '_msg', '_raw_msg':
-            setattr(self, 'reply' + method, getattr(self.chat, 'send' + method))
+    @cached_property
+    def card(self):
+        if self.type in (CARD, FRIENDS):
+            return User(self.get('RecommendInfo'))
+
+    # 以下 reply* 方法等同于 msg.chat.send* 方法，例如 msg.reply_image => msg.chat.send_image
+    # 仅在调用时才获取 msg.chat
+
+    def reply(self, *args, **kwargs):
+        return self.chat.send(*args, **kwargs)
+
+    def reply_image(self, *args, **kwargs):
+        return self.chat.send_image(*args, **kwargs)
+
+    def reply_file(self, *args, **kwargs):
+        return self.chat.send_file(*args, **kwargs)
+
+    def reply_video(self, *args, **kwargs):
+        return self.chat.send_video(*args, **kwargs)
+
+    def reply_msg(self, *args, **kwargs):
+        return self.chat.send_msg(*args, **kwargs)
+
+    def reply_raw_msg(self, *args, **kwargs):
+        return self.chat.send_raw_msg(*args, **kwargs)
+
+    def reply_nowait(self, msg, media_id=None, priority=HIGH):
+        return self.chat.send_nowait(msg, media_id, priority)
+
+    def reply_image_nowait(self, path, media_id=None, priority=HIGH):
+        return self.chat.send_image_nowait(path, media_id, priority)
+
+    def reply_file_nowait(self, path, media_id=None, priority=HIGH):
+        return self.chat.send_file_nowait(path, media_id, priority)
+
+    def reply_video_nowait(self, path=None, media_id=None, priority=HIGH):
+        return self.chat.send_video_nowait(path, media_id, priority)
+
+    def reply_async(self, *args, **kwargs):
+        return self.chat.send_async(*args, **kwargs)
+
+    def reply_image_async(self, *args, **kwargs):
+        return self.chat.send_image_async(*args, **kwargs)
+
+    def reply_file_async(self, *args, **kwargs):
+        return self.chat.send_file_async(*args, **kwargs)
+
+    def reply_video_async(self, *args, **kwargs):
+        return self.chat.send_video_async(*args, **kwargs)
+
+    def reply_msg_async(self, *args, **kwargs):
+        return self.chat.send_msg_async(*args, **kwargs)
+
+    def reply_raw_msg_async(self, *args, **kwargs):
+        return self.chat.send_raw_msg_async(*args, **kwargs)
 
     def __hash__(self):
         return hash((Message, self.id))
@@ -240,9 +440,9 @@ class Message(dict):
         """
         user_name = self.get('FromUserName')
         if user_name:
-            for _chat in self.robot.chats():
-                if _chat.user_name == user_name:
-                    return _chat
+            _chat = self.robot.registry.get(user_name)
+            if _chat is not None:
+                return _chat
             _chat = Chat(wrap_user_name(user_name))
             _chat.robot = self.robot
             return _chat
@@ -252,49 +452,284 @@ class Message(dict):
         """
         发送此消息的群聊成员 (若消息来自群聊)
         """
-        if isinstance(self.chat, Group):
+        _chat = self.chat
+        if isinstance(_chat, Group):
             actual_user_name = self.get('ActualUserName')
-            for _member in self.chat:
-                if _member.user_name == actual_user_name:
-                    return _member
-            return Member(dict(UserName=actual_user_name, NickName=self.get('ActualNickName')), self.chat)
+            _member = _chat.get_member(actual_user_name)
+            if _member is not None:
+                return _member
+            return Member(dict(UserName=actual_user_name, NickName=self.get('ActualNickName')), _chat)
 
 
-class Messages(list):
+class Messages(object):
     """
-    多条消息的合集，可用于记录或搜索
+    | 多条消息的合集，可用于记录或搜索
+    | 以环形缓冲的方式保存最近的消息，追加和淘汰旧消息均为 O(1)。
+    | 可为每个聊天对象单独设置保存上限，避免某个活跃的群聊挤掉其他聊天对象的记录。
+    | 按聊天对象、群聊成员、消息类型和发送时间维护了二级索引，用于加速 :meth:`search`。
     """
 
-    def __init__(self, msg_list=None, robot=None, max_history=10000):
-        if msg_list:
-            super(Messages, self).__init__(msg_list)
+    # 二级索引的名称，及从消息中获取索引键的方法
+    _index_keys = (
+        ('chat', lambda msg: msg.get('FromUserName')),
+        ('member', lambda msg: msg.get('ActualUserName')),
+        ('type', lambda msg: msg.type),
+    )
+
+    def __init__(self, msg_list=None, robot=None, max_history=10000, max_per_chat=None, archive=None):
+        """
+        :param msg_list: 初始的消息列表
+        :param robot: 所属的机器人
+        :param max_history: 最多保存的消息数量，为 0 或 None 时不限制
+        :param max_per_chat: 每个聊天对象最多保存的消息数量，为 0 或 None 时不限制
+        :param archive: 用于长期保存消息的 :class:`MessageArchive`，新追加的消息都会被存档
+        """
         self.robot = robot
-        self.max_history = max_history
+        self._max_history = max_history
+        self._max_per_chat = max_per_chat
+        self.archive = archive
 
-    def __add__(self, other):
-        return Chats(super(Messages, self).__add__(other))
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._reset()
+
+        for msg in msg_list or list():
+            self.append(msg)
+
+    @property
+    def max_history(self):
+        """
+        最多保存的消息数量，为 0 或 None 时不限制。修改后立即淘汰多出的旧消息
+        """
+        return self._max_history
+
+    @max_history.setter
+    def max_history(self, value):
+        with self._lock:
+            self._max_history = value
+            self._trim()
+
+    @property
+    def max_per_chat(self):
+        """
+        每个聊天对象最多保存的消息数量，为 0 或 None 时不限制。修改后立即淘汰多出的旧消息
+        """
+        return self._max_per_chat
+
+    @max_per_chat.setter
+    def max_per_chat(self, value):
+        with self._lock:
+            self._max_per_chat = value
+            self._trim()
+
+    def _trim(self, chats=None):
+        """
+        按保存上限淘汰最旧的消息
+
+        :param chats: 需检查上限的聊天对象的 user_name 列表，为 None 时检查所有聊天对象
+        """
+        if self._max_per_chat:
+            if chats is None:
+                chats = list(self._indexes['chat'])
+            for user_name in chats:
+                chat_seqs = self._indexes['chat'].get(user_name)
+                while chat_seqs and len(chat_seqs) > self._max_per_chat:
+                    self._evict(next(iter(chat_seqs)))
+
+        if self._max_history:
+            while len(self._messages) > self._max_history:
+                self._evict(next(iter(self._messages)))
+
+    def _reset(self):
+        # 序号 => 消息，按接收顺序排列
+        self._messages = OrderedDict()
+        # 索引名称 => 索引键 => 按接收顺序排列的消息序号
+        self._indexes = {name: dict() for name, _ in self._index_keys}
+        # 按发送时间排序的 (CreateTime, 序号)，被淘汰的项在累积到一定数量后才清理
+        self._times = list()
+        self._dead_times = 0
+        # 消息文本的倒排索引: 字符片段 => 消息序号
+        self._text_index = NgramIndex()
 
     def append(self, msg):
-        del self[:-self.max_history + 1]
-        return super(Messages, self).append(msg)
+        """
+        追加一条消息，并按需淘汰最旧的消息
+
+        :param msg: 消息对象
+        """
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+
+            self._messages[seq] = msg
 
-    def search(self, text=None, **attributes):
+            for name, get_key in self._index_keys:
+                key = get_key(msg)
+                if key is not None or name == 'chat':
+                    self._indexes[name].setdefault(key, OrderedDict())[seq] = None
+
+            create_time = msg.get('CreateTime')
+            if isinstance(create_time, int):
+                if self._times and (create_time, seq) < self._times[-1]:
+                    insort(self._times, (create_time, seq))
+                else:
+                    self._times.append((create_time, seq))
+
+            if msg.text and isinstance(msg.text, str):
+                self._text_index.add(seq, msg.text)
+
+            if self.archive is not None:
+                self.archive.put(msg)
+
+            self._trim((msg.get('FromUserName'),))
+
+    def _evict(self, seq):
+        """
+        淘汰指定序号的消息
+        """
+        msg = self._messages.pop(seq)
+        self._text_index.remove(seq)
+
+        for name, get_key in self._index_keys:
+            index = self._indexes[name]
+            key = get_key(msg)
+            seqs = index.get(key)
+            if seqs is not None:
+                seqs.pop(seq, None)
+                if not seqs:
+                    del index[key]
+
+        if isinstance(msg.get('CreateTime'), int):
+            self._dead_times += 1
+            if self._dead_times > len(self._messages):
+                self._times = [item for item in self._times if item[1] in self._messages]
+                self._dead_times = 0
+
+        return msg
+
+    def clear(self):
+        """
+        清空所有消息
         """
-        搜索消息
+        with self._lock:
+            self._reset()
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._messages.values())
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._snapshot())
+
+    def __reversed__(self):
+        return reversed(self._snapshot())
+
+    def __contains__(self, msg):
+        return msg in self._snapshot()
+
+    def __getitem__(self, x):
+        if isinstance(x, int):
+            with self._lock:
+                if x < 0:
+                    items = reversed(self._messages.values())
+                    x = -x - 1
+                else:
+                    items = iter(self._messages.values())
+                try:
+                    return next(islice(items, x, None))
+                except StopIteration:
+                    raise IndexError('message index out of range')
+        return self._snapshot()[x]
 
-        :param text:
+    def __add__(self, other):
+        return Chats(self._snapshot() + list(other))
+
+    def __repr__(self):
+        return repr(self._snapshot())
+
+    def search(self, text=None, since=None, until=None, limit=None, **attributes):
+        """
+        搜索消息。会优先使用索引缩小范围，例如::
+
+            # 群聊中的最近 10 条消息
+            robot.messages.search(chat=my_group, limit=10)
+            # 某群成员在最近 10 分钟内的消息
+            robot.messages.search(member=msg.member, since=datetime.now() - timedelta(minutes=10))
+            # 今天的所有图片
+            robot.messages.search(type=PICTURE, since=datetime.combine(date.today(), time()))
+
+        :param text: 消息文本中的关键词，可用空格分割，需同时包含所有关键词 (不区分大小写)
+        :param since: 发送时间的起点 (包含)，可为 datetime 或时间戳
+        :param until: 发送时间的终点 (不包含)，可为 datetime 或时间戳
+        :param limit: 最多返回的数量，超出时仅保留最近的消息
         :param attributes:
-        :return:
+            | 属性键值对，例如 type=TEXT
+            | 其中 chat(聊天对象), member(群聊成员) 可为对象或 user_name，与 type 一样可使用索引
+        :return: 匹配的消息，按接收顺序排列
         """
 
+        def to_timestamp(x):
+            if isinstance(x, datetime.datetime):
+                return x.timestamp()
+            return x
+
+        def in_time_range(msg):
+            create_time = msg.get('CreateTime')
+            if not isinstance(create_time, int):
+                return False
+            return (since is None or create_time >= since) and (until is None or create_time < until)
+
         def match(msg):
-            if not match_name(msg, text):
+            if (since is not None or until is not None) and not in_time_range(msg):
                 return
             for attr, value in attributes.items():
                 if (getattr(msg, attr, None) or msg.get(attr)) != value:
                     return
             return True
 
-        if text:
-            text = text.lower()
-        return Chats(filter(match, self), self.robot)
+        since, until = to_timestamp(since), to_timestamp(until)
+
+        with self._lock:
+
+            # 每个可用的索引提供一组候选序号，以最小的一组作为遍历的起点
+            candidates = list()
+
+            for name, _ in self._index_keys:
+                if name in attributes:
+                    value = attributes.pop(name)
+                    key = value if name == 'type' else get_user_name(value)
+                    candidates.append(self._indexes[name].get(key, ()))
+
+            if text:
+                candidates.append(self._text_index.search(text))
+
+            candidates.sort(key=len)
+
+            if since is not None or until is not None:
+                # 发送时间的范围仅在最小时作为起点，否则由 match() 逐条检查
+                lo = 0 if since is None else bisect_left(self._times, (since,))
+                hi = len(self._times) if until is None else bisect_left(self._times, (until,))
+                if not candidates or hi - lo < len(candidates[0]):
+                    candidates.insert(0, [seq for _, seq in self._times[lo:hi] if seq in self._messages])
+
+            if candidates:
+                driver, others = candidates[0], candidates[1:]
+                if not isinstance(driver, OrderedDict):
+                    driver = sorted(driver)
+            else:
+                driver, others = self._messages, list()
+
+            found = list()
+            for seq in reversed(driver):
+                if limit is not None and len(found) >= limit:
+                    break
+                if all(seq in x for x in others):
+                    msg = self._messages[seq]
+                    if match(msg):
+                        found.append(msg)
+
+        found.reverse()
+        return Chats(found, self.robot)
@@ -1,3 +1,4 @@
+from wxpy.chat import CompactChat
 from wxpy.user import User
 
 
@@ -5,4 +6,13 @@ class MP(User):
     """
     公众号对象
     """
-    pass
+
+    __slots__ = ()
+
+
+class CompactMP(CompactChat, MP):
+    """
+    紧凑的公众号对象，详见 :class:`CompactChat`
+    """
+
+    __slots__ = ('_schema', '_values')
@@ -0,0 +1,438 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from queue import Full
+
+from wxpy.response import Response, is_throttled, ret_code
+from wxpy.utils.constants import HIGH, NORMAL, LOW, BLOCK, DROP_OLDEST, REJECT
+
+logger = logging.getLogger('wxpy')
+
+
+class TokenBucket(object):
+    """
+    令牌桶，以固定的速率补充令牌，最多积攒 `capacity` 个，用于限制操作的频率
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        :param rate: 每秒补充的令牌数量，为 None 时不限制
+        :param capacity: 最多积攒的令牌数量，即允许的突发数量
+        """
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated = time.time()
+
+    def __repr__(self):
+        return '<{}: {}/s, {} tokens>'.format(self.__class__.__name__, self.rate, self.tokens)
+
+    @property
+    def tokens(self):
+        """
+        当前可用的令牌数量
+        """
+        if self.rate is None:
+            return self.capacity
+        now = time.time()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self._tokens
+
+    def delay(self):
+        """
+        距离下一个令牌可用还需等待的时间(秒)，若已有可用的令牌，则为 0
+        """
+        tokens = self.tokens
+        if tokens >= 1:
+            return 0
+        return (1 - tokens) / self.rate
+
+    def consume(self):
+        """
+        消耗一个令牌 (不检查是否可用)
+        """
+        if self.rate is not None:
+            self.tokens
+            self._tokens -= 1
+
+    @property
+    def full(self):
+        return self.tokens >= self.capacity
+
+    def drain(self):
+        """
+        清空已积攒的令牌
+        """
+        self.tokens
+        self._tokens = min(self._tokens, 0)
+
+
+class RateController(object):
+    """
+    | 基于 AIMD (加性增、乘性减) 的频率控制器，根据服务器的返回值自动调整操作的频率。
+    | 每次成功后，频率增加 `increase`；每当返回值表示操作过于频繁或服务器繁忙 (见 `THROTTLING_CODES`)，频率乘以 `decrease`。
+    | 因此频率会稳定在账号可承受的最高值附近，而无需手动设置间隔。
+    """
+
+    def __init__(self, rate, min_rate, max_rate, increase, decrease=0.5, burst=1, retries=3):
+        """
+        :param rate: 初始的频率 (每秒的次数)
+        :param min_rate: 最低的频率
+        :param max_rate: 最高的频率
+        :param increase: 每次成功后增加的频率
+        :param decrease: 过于频繁时，频率所乘的系数
+        :param burst: 允许的突发数量
+        :param retries: 因过于频繁而失败时的重试次数
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.retries = retries
+
+        #: 用于限制频率的令牌桶
+        self.bucket = TokenBucket(rate, burst)
+
+        #: 因过于频繁而被降低频率的次数
+        self.throttles = 0
+
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        if self.rate is None:
+            return '<{}: unlimited>'.format(self.__class__.__name__)
+        return '<{}: {:.3g}/s>'.format(self.__class__.__name__, self.rate)
+
+    @property
+    def rate(self):
+        """
+        当前允许的频率 (每秒的次数)
+        """
+        return self.bucket.rate
+
+    @rate.setter
+    def rate(self, value):
+        self.bucket.rate = value
+
+    def succeeded(self):
+        """
+        记录一次成功的操作，频率加性增加
+        """
+        with self._lock:
+            if self.rate is not None:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self):
+        """
+        记录一次因过于频繁而失败的操作，频率乘性降低，并清空已积攒的令牌
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, (self.rate or self.max_rate) * self.decrease)
+            self.bucket.drain()
+            self.throttles += 1
+        logger.warning('operation throttled by server, rate lowered to {:.3g}/s'.format(self.rate))
+
+    def wait(self):
+        """
+        等待直到频率允许下一次操作
+        """
+        while True:
+            with self._lock:
+                delay = self.bucket.delay()
+                if not delay:
+                    self.bucket.consume()
+                    return
+            time.sleep(delay)
+
+    def call(self, func, *args, **kwargs):
+        """
+        在频率的限制下调用 itchat 的方法，过于频繁时自动降低频率并重试
+
+        :param func: itchat 的方法
+        :param args: 方法的 args
+        :param kwargs: 方法的 kwargs
+        :return: 方法的返回结果 (重试后仍过于频繁时，为最后一次的结果)
+        """
+        for attempt in range(self.retries + 1):
+            self.wait()
+            ret = func(*args, **kwargs)
+            if not is_throttled(ret):
+                if not ret_code(ret):
+                    self.succeeded()
+                return ret
+            self.throttled()
+        return ret
+
+
+class Outbox(object):
+    """
+    | 发送消息的队列，所有的发送操作都在专门的发送线程中依次进行。
+    | 发送频率同时受全局的令牌桶和每个聊天对象的令牌桶限制，避免因发送过于频繁而被服务器拒绝。
+    | 待发送的消息按优先级排列: 已注册函数的自动回复 (HIGH) 优先于普通的发送 (NORMAL)，普通的发送优先于群发 (LOW)。
+    | 同一优先级下，发往同一聊天对象的消息按提交顺序发送，不同聊天对象之间轮流发送。
+    | 全局的发送频率由 :class:`RateController` 自动调整，因过于频繁而失败的消息会被重新发送。
+    | 等待发送的消息数量受 `max_pending` 限制，超出时的策略与 :class:`WorkerPool` 相同；
+    | 等待超过 `max_delay` 秒的消息不再发送，避免在积压后发出早已过时的回复。
+    """
+
+    def __init__(
+            self, robot, rate=5, burst=10, chat_rate=1, chat_burst=3, max_rate=20,
+            max_pending=1000, overflow=BLOCK, max_delay=60
+    ):
+        """
+        :param robot: 所属的机器人
+        :param rate: 全局每秒最多发送的消息数量的初始值，将根据服务器的返回值自动调整
+        :param burst: 全局允许的突发数量
+        :param chat_rate: 对每个聊天对象每秒最多发送的消息数量，为 None 时不限制
+        :param chat_burst: 对每个聊天对象允许的突发数量
+        :param max_rate: 全局每秒最多发送的消息数量的上限
+        :param max_pending: 等待发送的消息数量上限，为 0 或 None 时不限制
+        :param overflow:
+            | 等待的消息达到上限时的策略:
+            | BLOCK: 阻塞提交者，直到有空位 (默认)
+            | DROP_OLDEST: 丢弃最低优先级中最早的等待消息
+            | REJECT: 拒绝新的消息，抛出 `queue.Full` 异常
+        :param max_delay: 消息最长的等待时间(秒)，超时的消息将以 `TimeoutError` 失败，为 None 时不限制
+        """
+
+        if overflow not in (BLOCK, DROP_OLDEST, REJECT):
+            raise ValueError('unknown overflow policy: {}'.format(overflow))
+
+        self.robot = robot
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.max_delay = max_delay
+
+        #: 因队列已满而被丢弃的消息数量
+        self.dropped = 0
+        #: 因队列已满而被拒绝的消息数量
+        self.rejected = 0
+        #: 因等待超时而未发送的消息数量
+        self.expired = 0
+
+        #: 全局发送频率的控制器 (:class:`RateController`)，过于频繁时自动降低频率并重新发送
+        self.control = RateController(rate, min_rate=0.1, max_rate=max_rate, increase=0.05, burst=burst)
+        self.bucket = self.control.bucket
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        # 优先级 => OrderedDict(user_name => 待发送的任务)
+        self._queues = {priority: OrderedDict() for priority in (HIGH, NORMAL, LOW)}
+        # user_name => 令牌桶，仅保留近期发送过消息的聊天对象
+        self._buckets = dict()
+        self._pending = 0
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._thread = None
+
+    def __repr__(self):
+        return '<{}: {} pending>'.format(self.__class__.__name__, self.pending)
+
+    @property
+    def pending(self):
+        """
+        等待发送的消息数量
+        """
+        return self._pending
+
+    @property
+    def rate(self):
+        """
+        当前允许的全局发送频率 (每秒的消息数量)
+        """
+        return self.control.rate
+
+    def submit(self, user_name, func, priority=NORMAL, **kwargs):
+        """
+        提交一个发送任务
+
+        :param user_name: 接收者的 user_name
+        :param func: 实际进行发送的函数，例如 `robot.core.send`
+        :param priority: 优先级，可为 HIGH, NORMAL, LOW
+        :param kwargs: 函数的 kwargs
+        :return: :class:`concurrent.futures.Future` 对象，结果为 :class:`Response`，发送失败时为对应的异常
+        :raises queue.Full: 当策略为 REJECT 且队列已满时抛出
+        """
+
+        future = Future()
+        # 任务: (Future, 函数, kwargs, user_name, 优先级, 已重试的次数, 提交的时间)
+        task = future, func, kwargs, user_name, priority, 0, time.time()
+
+        if threading.current_thread() is self._thread:
+            # 在发送线程中提交的任务 (例如回调中的发送) 若排队等待将导致死锁，因此直接发送
+            self._run(task, retry=False)
+            return future
+
+        with self._lock:
+            while self._is_full():
+                if self.overflow == BLOCK:
+                    self._not_full.wait()
+                elif self.overflow == DROP_OLDEST:
+                    self._drop_oldest()
+                else:
+                    self.rejected += 1
+                    raise Full('{} pending messages in outbox'.format(self._pending))
+
+            self._queues[priority].setdefault(user_name, deque()).append(task)
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._send_loop, daemon=True, name='wxpy-sender')
+                self._thread.start()
+            self._wakeup.notify()
+
+        return future
+
+    def _is_full(self):
+        return self.max_pending and self._pending >= self.max_pending
+
+    def _pop(self, chats, user_name):
+        """
+        从指定优先级的队列中取出发往指定聊天对象的第一个任务
+        """
+        tasks = chats[user_name]
+        task = tasks.popleft()
+        if tasks:
+            chats.move_to_end(user_name)
+        else:
+            del chats[user_name]
+        self._pending -= 1
+        self._not_full.notify()
+        return task
+
+    def _drop_oldest(self):
+        """
+        丢弃最低优先级中最早的任务
+        """
+        for priority in (LOW, NORMAL, HIGH):
+            chats = self._queues[priority]
+            if chats:
+                task = self._pop(chats, min(chats, key=lambda user_name: chats[user_name][0][6]))
+                if task[5]:
+                    # 因过于频繁而重新排队的任务已处于运行状态，无法取消
+                    task[0].set_exception(Full('dropped from outbox'))
+                else:
+                    task[0].cancel()
+                self.dropped += 1
+                return
+
+    def _chat_bucket(self, user_name):
+        bucket = self._buckets.get(user_name)
+        if bucket is None:
+            bucket = self._buckets[user_name] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_task(self):
+        """
+        取出下一个可以发送的任务
+
+        :return: (任务, 0)，或 (None, 需等待的时间)
+        """
+
+        wait = self.bucket.delay()
+        if wait:
+            return None, wait
+
+        wait = None
+        now = time.time()
+        for priority in (HIGH, NORMAL, LOW):
+            chats = self._queues[priority]
+            for user_name in list(chats):
+                # 先丢弃已超时的任务，即使这个聊天对象暂时不能发送
+                while user_name in chats and self._expired(chats[user_name][0], now):
+                    self._expire(self._pop(chats, user_name))
+                if user_name not in chats:
+                    continue
+
+                bucket = self._chat_bucket(user_name)
+                delay = bucket.delay()
+                if delay:
+                    if self.max_delay:
+                        # 在等待的任务超时时及时醒来，以便释放队列中的空位
+                        delay = min(delay, max(0, self.max_delay - (now - chats[user_name][0][6])))
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+
+                task = self._pop(chats, user_name)
+                bucket.consume()
+                self.bucket.consume()
+                return task, 0
+
+        return None, wait
+
+    def _expired(self, task, now):
+        return self.max_delay and now - task[6] > self.max_delay
+
+    def _expire(self, task):
+        future, retried = task[0], task[5]
+        # 因过于频繁而重新排队的任务已处于运行状态
+        if retried or future.set_running_or_notify_cancel():
+            self.expired += 1
+            future.set_exception(TimeoutError('message not sent within {} seconds'.format(self.max_delay)))
+
+    def _prune_buckets(self):
+        for user_name, bucket in list(self._buckets.items()):
+            if bucket.full:
+                del self._buckets[user_name]
+
+    def _send_loop(self):
+        while True:
+            # noinspection PyBroadException
+            try:
+                with self._lock:
+                    while True:
+                        task, wait = self._next_task()
+                        if task:
+                            break
+                        if not self._pending:
+                            self._prune_buckets()
+                        self._wakeup.wait(wait)
+            except:
+                logger.exception('unexpected error while scheduling in sender thread')
+                time.sleep(1)
+                continue
+
+            # noinspection PyBroadException
+            try:
+                self._run(task)
+            except:
+                logger.exception('unexpected error in sender thread')
+                if not task[0].done():
+                    task[0].set_exception(RuntimeError('failed to send'))
+
+    def _run(self, task, retry=True):
+        future, func, kwargs, user_name, priority, retried, submitted = task
+        if not retried and not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            result = func(**kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            return
+
+        if is_throttled(result):
+            self.control.throttled()
+            if retry and retried < self.control.retries:
+                # 重新放回队首，在频率降低后再次发送
+                with self._lock:
+                    self._queues[priority].setdefault(user_name, deque()).appendleft(
+                        (future, func, kwargs, user_name, priority, retried + 1, submitted))
+                    self._queues[priority].move_to_end(user_name, last=False)
+                    self._pending += 1
+                return
+        elif not ret_code(result):
+            self.control.succeeded()
+
+        try:
+            if result:
+                result = Response(result, self.robot)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
@@ -0,0 +1,126 @@
+import threading
+from collections.abc import Mapping
+
+from wxpy.chat import _get_schema
+
+
+class Profile(Mapping):
+    """
+    | 单个用户的共享资料 (昵称、性别、地区、签名等)，为只读的映射。
+    | 与紧凑聊天对象一样，以值的元组保存，键的位置由所有键相同的资料共享。
+    """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, raw):
+        # 键的位置与值保存在同一个元组中: (键的位置, 值1, 值2, ...)，更新时整体替换，读取时无需加锁
+        self._data = (_get_schema(raw.keys()),) + tuple(raw.values())
+
+    def _update(self, raw):
+        """
+        合并新的资料，已有的值仅会被新的非空值覆盖
+        """
+        data = self._data
+        merged = dict(zip(data[0], data[1:]))
+        for key, value in raw.items():
+            if value or key not in merged:
+                merged[key] = value
+        self._data = (_get_schema(merged.keys()),) + tuple(merged.values())
+
+    def get(self, key, default=None):
+        data = self._data
+        i = data[0].get(key)
+        if i is None:
+            return default
+        return data[i + 1]
+
+    def __getitem__(self, key):
+        data = self._data
+        i = data[0].get(key)
+        if i is None:
+            raise KeyError(key)
+        return data[i + 1]
+
+    def __contains__(self, key):
+        return key in self._data[0]
+
+    def __iter__(self):
+        return iter(self._data[0])
+
+    def __len__(self):
+        return len(self._data) - 1
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__name__, self.get('NickName'))
+
+
+class UserProfiles(object):
+    """
+    | 用户资料的标识映射 (identity map)，以 user_name 为键。
+    | 同一用户在多个群聊中的成员对象共享同一份 :class:`Profile`，成员对象仅保存与群聊相关的字段。
+    | 因此，同一用户的所有成员对象的 `profile` 属性为同一个对象，可直接以 `is` 判断。
+    """
+
+    #: 与群聊相关的字段，由各个成员对象单独保存，不放入共享资料中
+    group_fields = ('UserName', 'DisplayName', 'MemberStatus')
+
+    def __init__(self):
+        self._profiles = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __repr__(self):
+        return '<{}: {} profiles>'.format(self.__class__.__name__, len(self))
+
+    def get(self, user_name):
+        """
+        获取指定用户的共享资料
+
+        :param user_name: 用户的 user_name
+        :return: 共享资料，若不存在则为 None
+        """
+        return self._profiles.get(user_name)
+
+    def prune(self, user_names):
+        """
+        移除不在给定集合中的用户的共享资料，通常由 :class:`ChatRegistry` 在群聊发生变化后调用。
+        已有的成员对象仍持有各自的资料，仅之后新建的成员对象不再与它们共享。
+
+        :param user_names: 需保留的用户的 user_name 集合
+        :return: 移除的数量
+        """
+        with self._lock:
+            removed = [user_name for user_name in self._profiles if user_name not in user_names]
+            for user_name in removed:
+                del self._profiles[user_name]
+        return len(removed)
+
+    def split(self, raw):
+        """
+        将原始的用户数据拆分为共享资料和仅属于群聊的字段。
+        共享资料中已有的值仅会被新的非空值覆盖，避免信息较少的数据覆盖较详细的数据。
+
+        :param raw: 原始的用户数据
+        :return: 共享资料，以及仅属于群聊的字段
+        """
+
+        own = dict()
+        shared = dict()
+        for key, value in raw.items():
+            if key in self.group_fields:
+                own[key] = value
+            else:
+                shared[key] = value
+
+        user_name = raw.get('UserName')
+
+        with self._lock:
+            profile = self._profiles.get(user_name)
+            if profile is None:
+                profile = self._profiles[user_name] = Profile(shared)
+            elif any(profile.get(key, profile) != value for key, value in shared.items()):
+                profile._update(shared)
+
+        return profile, own
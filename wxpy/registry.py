@@ -0,0 +1,337 @@
+import threading
+
+import time
+
+from wxpy.chats import Chats
+from wxpy.friend import Friend, CompactFriend
+from wxpy.group import Group, CompactGroup
+from wxpy.groups import Groups
+from wxpy.mp import MP, CompactMP
+from wxpy.response import Response
+from wxpy.utils.indexes import NameIndex
+from wxpy.utils.tools import get_user_name, name_text
+
+
+def _fingerprint(raw):
+    """
+    原始联系人字典的指纹，用于判断联系人是否发生变化。
+    仅保留各字段的哈希值，而不保留原始字典的副本。
+
+    群聊的成员列表仅比较数量，成员的详细变化由 :meth:`Group.update_group` 负责
+    """
+    items = list()
+    members = 0
+    for key, value in raw.items():
+        if key == 'MemberList':
+            members = len(value or ())
+            continue
+        try:
+            hash(value)
+        except TypeError:
+            value = repr(value)
+        items.append((key, value))
+    return hash(frozenset(items)), members
+
+
+class ChatRegistry(object):
+    """
+    | 机器人的聊天对象注册表，以 user_name 为键，与 itchat 的本地联系人存储保持同步。
+    | 用于将 user_name 快速解析为对应的聊天对象，而无需每次重建所有联系人。
+    | 每当联系人发生变化，:attr:`generation` 会加 1，且仅重建发生变化的联系人。
+    | 同时维护所有聊天对象的名称索引，供 :meth:`Chats.search` 使用，
+    | 以及从用户到所在群聊的反向索引，供 :meth:`Groups.search` 使用。
+    """
+
+    def __init__(self, robot, check_interval=5):
+        """
+        :param robot: 注册表所属的机器人
+        :param check_interval: 逐个比对联系人内容的最小间隔(秒)，期间仅检查联系人数量的变化
+        """
+        self.robot = robot
+        self.check_interval = check_interval
+
+        #: 联系人的版本号，每当有联系人发生变化时加 1
+        self.generation = 0
+
+        self._chats = dict()
+        # user_name => (聊天对象, 指纹)
+        self._entries = dict()
+        self._signature = None
+        self._checked = 0
+        self._dirty = True
+        self._lock = threading.RLock()
+
+        #: 所有聊天对象的名称索引，随联系人的变化增量更新
+        self.name_index = NameIndex()
+
+        # user_name => 所在群聊的 user_name 集合
+        self._memberships = dict()
+        # 群聊的 user_name => 成员的 user_name 集合
+        self._group_members = dict()
+
+        self._friends = Chats(source=robot)
+        self._groups = Groups()
+        self._mps = Chats()
+        self._all = Chats(source=robot)
+
+    def _storage(self):
+        """
+        itchat 中的本地联系人存储，及其对应的聊天对象类
+        """
+        core = self.robot.core
+        if getattr(self.robot, 'compact', False):
+            return (
+                (CompactFriend, core.memberList),
+                (CompactGroup, core.chatroomList),
+                (CompactMP, core.mpList),
+            )
+        return (
+            (Friend, core.memberList),
+            (Group, core.chatroomList),
+            (MP, core.mpList),
+        )
+
+    def _snapshot(self, user_name=None):
+        """
+        | 在 itchat 的更新锁下复制本地存储中的原始数据 (包括群聊的成员列表)。
+        | itchat 会在更新联系人时原地修改这些字典，因此不能在锁外遍历它们，建立的聊天对象也不应引用它们。
+
+        :param user_name: 仅复制指定 user_name 的原始数据
+        :return: (聊天对象类, 原始数据的列表) 的列表
+        """
+
+        def copy(raw):
+            raw = dict(raw)
+            if raw.get('MemberList'):
+                raw['MemberList'] = [dict(member) for member in raw['MemberList']]
+            return raw
+
+        with self.robot.core.storageClass.updateLock:
+            return [
+                (chat_class, [copy(raw) for raw in raws if user_name is None or raw.get('UserName') == user_name])
+                for chat_class, raws in self._storage()
+            ]
+
+    def _storage_signature(self):
+        return tuple((id(raws), len(raws)) for _, raws in self._storage())
+
+    def _is_outdated(self, signature):
+        return self._dirty or signature != self._signature or \
+            time.time() - self._checked >= self.check_interval
+
+    def invalidate(self):
+        """
+        标记注册表需要检查，将在下次访问时与 itchat 的本地存储进行比对
+        """
+        self._dirty = True
+
+    def sync(self, force=False):
+        """
+        与 itchat 的本地存储进行比对，仅重建发生变化的联系人
+
+        :param force: 是否忽略检查间隔，立即比对
+        :return: 比对后的 :attr:`generation`
+        """
+
+        if not (force or self._is_outdated(self._storage_signature())):
+            return self.generation
+
+        with self._lock:
+            signature = self._storage_signature()
+            if not (force or self._is_outdated(signature)):
+                return self.generation
+
+            changed = False
+            entries = dict()
+            collections = list()
+
+            for chat_class, raws in self._snapshot():
+                collection = list()
+                for raw in raws:
+                    user_name = raw.get('UserName')
+                    if user_name in entries:
+                        continue
+                    fingerprint = _fingerprint(raw)
+                    entry = self._entries.get(user_name)
+                    if not entry or type(entry[0]) is not chat_class or entry[1] != fingerprint:
+                        entry = chat_class(Response(raw, self.robot)), fingerprint
+                        self.name_index.add(user_name, name_text(entry[0]))
+                        if isinstance(entry[0], Group):
+                            self._set_group_members(user_name, set(entry[0]._member_index))
+                        changed = True
+                    entries[user_name] = entry
+                    collection.append(entry[0])
+                collections.append(collection)
+
+            if changed or len(entries) != len(self._entries):
+                for user_name in self._entries.keys() - entries.keys():
+                    self.name_index.remove(user_name)
+                    self._set_group_members(user_name, set())
+
+                friends, groups, mps = collections
+                self._entries = entries
+                self._chats = {user_name: entry[0] for user_name, entry in entries.items()}
+                self._friends = Chats(friends, self.robot, self.name_index)
+                self._groups = Groups(groups, self)
+                self._mps = Chats(mps, name_index=self.name_index)
+                self._all = Chats(friends + groups + mps, self.robot, self.name_index)
+                self.generation += 1
+                self._prune_profiles()
+
+            self._signature = signature
+            self._checked = time.time()
+            self._dirty = False
+
+            return self.generation
+
+    def _set_group_members(self, group_name, members):
+        """
+        更新反向索引中一个群聊的成员
+        """
+        old = self._group_members.pop(group_name, set())
+        for user_name in old - members:
+            groups = self._memberships.get(user_name)
+            if groups is not None:
+                groups.discard(group_name)
+                if not groups:
+                    del self._memberships[user_name]
+        for user_name in members - old:
+            self._memberships.setdefault(user_name, set()).add(group_name)
+        if members:
+            self._group_members[group_name] = members
+
+    def _find_raw(self, user_name, chat_class):
+        """
+        在 itchat 的本地存储中找到指定聊天对象类的原始数据
+        """
+        for storage_class, raws in self._snapshot(user_name):
+            if storage_class is chat_class and raws:
+                return raws[0]
+
+    def adopt(self, chat):
+        """
+        | 采用一个刚从服务器更新的聊天对象 (例如 :meth:`Group.update_group` 后的群聊)，
+        | 并记录其在 itchat 本地存储中的新指纹，避免下次比对时再次重建这个聊天对象。
+        | 若本地存储中没有这个聊天对象，或类型不一致，则标记注册表需要检查。
+
+        :param chat: 聊天对象
+        """
+        user_name = chat.user_name
+        with self._lock:
+            raw = self._find_raw(user_name, type(chat))
+            if raw is None:
+                self.invalidate()
+                return
+
+            old = self._entries.get(user_name, (None,))[0]
+            self._entries[user_name] = chat, _fingerprint(raw)
+            self._chats[user_name] = chat
+            self.name_index.add(user_name, name_text(chat))
+            if isinstance(chat, Group):
+                self._set_group_members(user_name, set(chat._member_index))
+
+            if old is not chat:
+                for collection in self._friends, self._groups, self._mps, self._all:
+                    for i, item in enumerate(collection):
+                        if item is old:
+                            collection[i] = chat
+            self.generation += 1
+            self._prune_profiles()
+
+    def _prune_profiles(self):
+        """
+        移除已不在任何群聊中的用户的共享资料，避免其随着群聊的变化无限增长
+        """
+        profiles = getattr(self.robot, 'profiles', None)
+        if profiles is not None:
+            profiles.prune(self._memberships)
+
+    def index_group(self, group):
+        """
+        根据群聊对象中已载入的成员列表，更新反向索引中这个群聊的成员 (不会更新群聊)
+
+        :param group: 群聊对象
+        """
+        with self._lock:
+            self._set_group_members(group.user_name, set(group._member_index))
+
+    def group_names_of(self, users):
+        """
+        根据反向索引，获取同时包含所有给定用户的群聊。
+        仅使用已载入的成员列表，不会进行网络请求。
+
+        :param users: 用户对象或 user_name 的列表
+        :return: 群聊的 user_name 集合
+        """
+        self.sync()
+        with self._lock:
+            found = sorted(
+                (self._memberships.get(get_user_name(user), set()) for user in users),
+                key=len
+            )
+            if not found:
+                return set(self._group_members)
+            return found[0].intersection(*found[1:])
+
+    def common_groups(self, *users):
+        """
+        获取同时包含所有给定用户的群聊，例如两位好友的共同群聊::
+
+            robot.registry.common_groups(friend_a, friend_b)
+
+        :param users: 用户对象或 user_name
+        :return: 群聊的合集
+        """
+        group_names = self.group_names_of(users)
+        return Groups([group for group in self.groups() if group.user_name in group_names], self)
+
+    def get(self, user_name, default=None):
+        """
+        根据 user_name 获取聊天对象
+
+        :param user_name: 聊天对象的 user_name
+        :param default: 找不到时返回的值
+        :return: 对应的聊天对象
+        """
+        self.sync()
+        return self._chats.get(user_name, default)
+
+    def chats(self):
+        """
+        所有聊天对象。每次返回新的副本，可以自由修改；在联系人发生变化前，副本共用已建立的索引
+        """
+        self.sync()
+        return self._all.copy()
+
+    def friends(self):
+        """
+        所有好友。每次返回新的副本，可以自由修改；在联系人发生变化前，副本共用已建立的索引
+        """
+        self.sync()
+        return self._friends.copy()
+
+    def groups(self):
+        """
+        所有群聊。每次返回新的副本，可以自由修改；在联系人发生变化前，副本共用已建立的索引
+        """
+        self.sync()
+        return Groups(self._groups, self)
+
+    def mps(self):
+        """
+        所有公众号。每次返回新的副本，可以自由修改；在联系人发生变化前，副本共用已建立的索引
+        """
+        self.sync()
+        return self._mps.copy()
+
+    def __contains__(self, user_name):
+        self.sync()
+        return user_name in self._chats
+
+    def __len__(self):
+        self.sync()
+        return len(self._chats)
+
+    def __repr__(self):
+        return '<{}: {} chats (generation {})>'.format(
+            self.__class__.__name__, len(self._chats), self.generation)
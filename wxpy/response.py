@@ -1,3 +1,6 @@
+from wxpy.utils.constants import THROTTLING_CODES
+
+
 class Response(dict):
     """
     | 从 itchat 获得的网络请求返回结果，绑定所属的 Robot 属性。
@@ -14,11 +17,45 @@ class Response(dict):
         self.err_msg = self.base_response.get('ErrMsg')
 
         if self.ret_code:
-            raise ResponseError('code: {0.ret_code}; msg: {0.err_msg}'.format(self))
+            raise ResponseError('code: {0.ret_code}; msg: {0.err_msg}'.format(self), self.ret_code, self.err_msg)
+
+
+def ret_code(raw):
+    """
+    获取 itchat 返回结果中的返回值 (BaseResponse.Ret)
+
+    :param raw: itchat 的返回结果
+    :return: 返回值，若结果中没有返回值，则为 None
+    """
+    if isinstance(raw, dict):
+        return raw.get('BaseResponse', dict()).get('Ret')
+
+
+def is_throttled(raw):
+    """
+    检查 itchat 的返回结果是否表示操作过于频繁或服务器繁忙，返回值的分类见 `THROTTLING_CODES`
+
+    :param raw: itchat 的返回结果
+    """
+    return ret_code(raw) in THROTTLING_CODES
 
 
 class ResponseError(Exception):
     """
     当 :class:`Response` 的返回值不为 0 时抛出的异常
     """
-    pass
+
+    def __init__(self, msg, err_code=None, err_msg=None):
+        super(ResponseError, self).__init__(msg)
+
+        #: 返回值 (BaseResponse.Ret)
+        self.err_code = err_code
+        #: 错误信息
+        self.err_msg = err_msg
+
+    @property
+    def throttled(self):
+        """
+        是否因操作过于频繁或服务器繁忙而失败，此时稍后重试通常可以成功
+        """
+        return self.err_code in THROTTLING_CODES
@@ -6,22 +6,41 @@ class User(Chat):
     好友(:class:`Friend`)、群聊成员(:class:`Member`)，和公众号(:class:`MP`) 的基础类
     """
 
-    def __init__(self, response):
-        super(User, self).__init__(response)
+    __slots__ = ()
 
-        self.alias = response.get('Alias')
-        self.display_name = response.get('DisplayName')
-        self.remark_name = response.get('RemarkName')
-        self.sex = response.get('Sex')
-        self.province = response.get('Province')
-        self.city = response.get('City')
-        self.signature = response.get('Signature')
+    @property
+    def alias(self):
+        return self.get('Alias')
+
+    @property
+    def display_name(self):
+        return self.get('DisplayName')
+
+    @property
+    def remark_name(self):
+        return self.get('RemarkName')
+
+    @property
+    def sex(self):
+        return self.get('Sex')
+
+    @property
+    def province(self):
+        return self.get('Province')
+
+    @property
+    def city(self):
+        return self.get('City')
+
+    @property
+    def signature(self):
+        return self.get('Signature')
 
-    def add(self, verify_content=''):
-        return self.robot.add_friend(verify_content=verify_content)
+    def add(self, verify_content='', auto_update=True):
+        return self.robot.add_friend(self, verify_content=verify_content, auto_update=auto_update)
 
     def accept(self, verify_content=''):
-        return self.robot.accept_friend(verify_content=verify_content)
+        return self.robot.accept_friend(self, verify_content=verify_content)
 
     @property
     def is_friend(self):
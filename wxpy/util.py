@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
+import hashlib
 import logging
+from collections import Counter
 from functools import wraps
 
 from wxpy.bot import Robot
 from wxpy.chats import Chats
 from wxpy.response import ResponseError
-from wxpy.user import User
 
 
 def dont_raise_response_error(func):
@@ -25,37 +26,80 @@ def dont_raise_response_error(func):
     return wrapped
 
 
-def mutual_friends(*args):
+def friend_fingerprint(user):
     """
-    找到多个微信用户的共同好友
+    用户的整数指纹，由昵称、省份、城市和 AttrStatus 计算而来。
+    同一用户在不同微信号的好友列表中的 user_name 不同，因此需以指纹来判断是否为同一人。
 
-    :param args: 每个参数为一个微信用户的机器人(Robot)，或是聊天对象合集(Chats)
-    :return: 共同的好友列表
+    :param user: 用户对象
+    :return: 64 位的整数
     """
+    text = '\x1f'.join(str(x) for x in (user.nick_name, user.province, user.city, user.get('AttrStatus')))
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
 
-    class FuzzyUser(User):
-        def __init__(self, user):
-            super(FuzzyUser, self).__init__(user)
 
-        def __hash__(self):
-            return hash((self.nick_name, self.province, self.city, self['AttrStatus']))
+def _scan_friends(args):
+    """
+    依次扫描每个微信用户的好友，仅保留指纹
 
-    mutual = set()
+    :return: (指纹 => 拥有该好友的微信用户的位掩码, 第一个微信用户的 (指纹, 好友) 列表)
+    """
+
+    masks = dict()
+    first = list()
 
-    for arg in args:
+    for i, arg in enumerate(args):
         if isinstance(arg, Robot):
-            friends = map(FuzzyUser, arg.friends)
+            friends = arg.friends()
         elif isinstance(arg, Chats):
-            friends = map(FuzzyUser, arg)
+            friends = arg
         else:
-            raise TypeError
+            raise TypeError('expected Robot or Chats, {} found'.format(type(arg)))
 
-        if mutual:
-            mutual &= set(friends)
-        else:
-            mutual.update(friends)
+        bit = 1 << i
+        for friend in friends:
+            fingerprint = friend_fingerprint(friend)
+            masks[fingerprint] = masks.get(fingerprint, 0) | bit
+            if not i:
+                first.append((fingerprint, friend))
+
+    return masks, first
+
+
+def mutual_friends(*args):
+    """
+    找到多个微信用户的共同好友
+
+    :param args: 每个参数为一个微信用户的机器人(Robot)，或是聊天对象合集(Chats)
+    :return: 共同的好友列表 (来自第一个微信用户的好友)
+    """
+
+    masks, first = _scan_friends(args)
+    everyone = (1 << len(args)) - 1
+    return Chats([friend for fingerprint, friend in first if masks[fingerprint] == everyone])
+
+
+def friends_overlap(*args):
+    """
+    一次性计算多个微信用户之间两两的共同好友数量
+
+    :param args: 每个参数为一个微信用户的机器人(Robot)，或是聊天对象合集(Chats)
+    :return: 共同好友数量的矩阵 (嵌套列表)，第 i 行第 j 列为第 i 个与第 j 个微信用户的共同好友数量，
+        对角线为各个微信用户的好友数量 (以指纹去重)
+    """
+
+    masks, _ = _scan_friends(args)
+    matrix = [[0] * len(args) for _ in args]
+
+    # 拥有相同位掩码的好友对矩阵的贡献相同，因此只需按不同的位掩码累加
+    for mask, count in Counter(masks.values()).items():
+        owners = [i for i in range(len(args)) if mask >> i & 1]
+        for i in owners:
+            row = matrix[i]
+            for j in owners:
+                row[j] += count
 
-    return Chats(mutual)
+    return matrix
 
 
 def ensure_one(found):
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    | 带有过期时间的缓存，超出容量时淘汰最久未使用的项。
+    | 所有操作都是线程安全的。
+    """
+
+    def __init__(self, ttl=600, max_size=None):
+        """
+        :param ttl: 每一项的有效时间(秒)，为 None 时永不过期
+        :param max_size: 最多保存的项数，为 None 时不限制
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # 键 => (值, 过期时间)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __repr__(self):
+        return '<{}: {} items>'.format(self.__class__.__name__, len(self))
+
+    def get(self, key, default=None):
+        """
+        获取未过期的值
+
+        :param key: 键
+        :param default: 不存在或已过期时返回的值
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires is not None and expires <= time.time():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        设置一项的值
+
+        :param key: 键
+        :param value: 值
+        :param ttl: 这一项的有效时间(秒)，默认使用 :attr:`ttl`
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._items[key] = value, None if ttl is None else time.time() + ttl
+            self._items.move_to_end(key)
+            if self.max_size is not None:
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        移除一项，并返回其值 (即使已过期)
+
+        :param key: 键
+        :param default: 不存在时返回的值
+        """
+        with self._lock:
+            item = self._items.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._items.clear()
+
+    def items(self):
+        """
+        所有未过期的 (键, 值)，按从最久未使用到最近使用排列
+        """
+        now = time.time()
+        with self._lock:
+            return [(k, v) for k, (v, expires) in self._items.items() if expires is None or expires > now]
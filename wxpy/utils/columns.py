@@ -0,0 +1,122 @@
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Columns(object):
+    """
+    | 聊天对象合集的列式快照，用于快速统计。
+    | 每个属性被编码为一列整数 (类别编号)，及编号所对应的属性值。
+    | 若已安装 NumPy，列以数组保存，统计均为向量化的 `bincount`；否则使用纯 Python 实现，结果相同。
+    """
+
+    def __init__(self, chats):
+        """
+        :param chats: 聊天对象的合集，快照建立后合集的变化不会反映到快照中
+        """
+        self.chats = list(chats)
+        # 属性名 => (类别编号的列, 属性值的列表)
+        self._columns = dict()
+
+    def __len__(self):
+        return len(self.chats)
+
+    def column(self, attr):
+        """
+        获取属性的列，首次获取时进行编码
+
+        :param attr: 属性名
+        :return: (类别编号的列, 属性值的列表)
+        """
+        column = self._columns.get(attr)
+        if column is None:
+            categories = dict()
+            codes = [categories.setdefault(getattr(chat, attr, None), len(categories)) for chat in self.chats]
+            if numpy is not None:
+                codes = numpy.array(codes, dtype=numpy.int64)
+            column = self._columns[attr] = codes, list(categories)
+        return column
+
+    def counts(self, attr):
+        """
+        统计属性值的分布
+
+        :param attr: 属性名
+        :return: 属性值 => 数量的 Counter
+        """
+        codes, categories = self.column(attr)
+        if numpy is None:
+            counts = Counter(codes)
+            return Counter({categories[code]: count for code, count in counts.items()})
+        counts = numpy.bincount(codes, minlength=len(categories))
+        return Counter({categories[code]: int(count) for code, count in enumerate(counts) if count})
+
+    def group_counts(self, attribs):
+        """
+        统计多个属性的组合的分布，例如 ('province', 'sex')
+
+        :param attribs: 属性名的列表或元组
+        :return: (属性值, ...) => 数量的 Counter
+        """
+        columns = [self.column(attr) for attr in attribs]
+        if not columns:
+            return Counter()
+
+        if numpy is None:
+            counts = Counter(zip(*(codes for codes, _ in columns)))
+            return Counter({
+                tuple(categories[code] for code, (_, categories) in zip(key, columns)): count
+                for key, count in counts.items()
+            })
+
+        size = 1
+        for _, categories in columns:
+            size *= len(categories)
+
+        if size > 4 * len(self) + 1024:
+            # 组合的数量远多于聊天对象 (或超出 int64 的范围)，改为对编号的各列直接去重计数
+            keys, counts = numpy.unique(numpy.stack([codes for codes, _ in columns]), axis=1, return_counts=True)
+            return Counter({
+                tuple(categories[int(code)] for code, (_, categories) in zip(key, columns)): int(count)
+                for key, count in zip(keys.T, counts)
+            })
+
+        # 将多个类别编号合并为一个编号，即可通过一次 bincount 完成统计
+        combined = numpy.zeros(len(self), dtype=numpy.int64)
+        for codes, categories in columns:
+            combined = combined * len(categories) + codes
+        counts = numpy.bincount(combined)
+
+        ret = Counter()
+        for code in numpy.flatnonzero(counts):
+            key = list()
+            remainder = int(code)
+            for _, categories in reversed(columns):
+                remainder, i = divmod(remainder, len(categories))
+                key.append(categories[i])
+            ret[tuple(reversed(key))] = int(counts[code])
+        return ret
+
+    def top(self, attr, n=10, skip_empty=True):
+        """
+        获取数量最多的 n 个属性值
+
+        :param attr: 属性名
+        :param n: 最多返回的数量
+        :param skip_empty: 是否忽略空值
+        :return: (属性值, 数量) 的列表，按数量从多到少排列
+        """
+        codes, categories = self.column(attr)
+        if numpy is None:
+            ret = self.counts(attr).most_common()
+        else:
+            counts = numpy.bincount(codes, minlength=len(categories))
+            # 稳定排序，数量相同时保持属性值首次出现的顺序
+            order = numpy.argsort(-counts, kind='stable')
+            ret = [(categories[code], int(counts[code])) for code in order if counts[code]]
+        if skip_empty:
+            ret = [(value, count) for value, count in ret if value]
+        return ret[:n]
@@ -25,3 +25,36 @@ VIDEO = 'Video'
 FRIENDS = 'Friends'
 # 系统
 SYSTEM = 'System'
+
+# ---- 处理队列已满时的策略 ----
+
+# 阻塞提交任务的线程 (例如消息监听线程)，直到队列中有空位
+BLOCK = 'block'
+# 丢弃队列中最早的任务
+DROP_OLDEST = 'drop_oldest'
+# 拒绝新的任务
+REJECT = 'reject'
+
+# ---- 已注册函数的执行顺序 ----
+
+# 来自同一聊天对象的消息依次处理，不同聊天对象的消息并行处理
+PER_CHAT = 'per_chat'
+
+# ---- 名称搜索 ----
+
+# 搜索名称时所匹配的属性
+NAME_ATTRIBUTES = ('nick_name', 'alias', 'remark_name', 'display_name')
+
+# ---- 发送消息的优先级 (数值越小越优先) ----
+
+# 已注册函数的自动回复
+HIGH = 0
+# 普通的发送
+NORMAL = 1
+# 群发等批量发送
+LOW = 2
+
+# ---- 表示操作过于频繁或服务器繁忙的返回值 (BaseResponse.Ret) ----
+
+# 1205: 操作过于频繁; -1: 系统繁忙
+THROTTLING_CODES = {1205, -1}
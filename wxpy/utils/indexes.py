@@ -0,0 +1,283 @@
+import heapq
+import re
+import threading
+
+
+def normalize(text):
+    """
+    将文本转化为用于建立索引和搜索的统一形式
+
+    :param text: 文本
+    :return: 小写的文本
+    """
+    return str(text).lower()
+
+
+def split_keywords(keywords):
+    """
+    将关键词拆分为列表并转化为统一形式
+
+    :param keywords: 关键词，可用空格分割，或为关键词列表
+    :return: 关键词列表
+    """
+    if isinstance(keywords, str):
+        keywords = re.split(r'\s+', keywords)
+    return [normalize(kw) for kw in keywords if kw]
+
+
+def ngrams(text, size):
+    """
+    获取文本中所有长度为 size 的连续字符片段
+
+    :param text: 文本
+    :param size: 片段的长度
+    :return: 片段的集合
+    """
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NgramIndex(object):
+    """
+    | 基于字符 n-gram 的倒排索引，可对任意的键进行增量的添加、移除和子串搜索。
+    | 由于按字符切分，中文等不以空格分词的文本同样可以搜索。
+    """
+
+    def __init__(self, sizes=(1, 2)):
+        """
+        :param sizes: 建立索引的片段长度，搜索时优先使用不超过关键词长度的最长片段
+        """
+        self.sizes = sorted(sizes)
+
+        # 片段 => 键的集合
+        self._postings = dict()
+        # 键 => 统一形式的文本，用于移除索引及校验搜索结果
+        self._texts = dict()
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, key):
+        return key in self._texts
+
+    def _grams(self, text):
+        for size in self.sizes:
+            for gram in ngrams(text, size):
+                yield gram
+
+    def _query_grams(self, keyword):
+        sizes = [size for size in self.sizes if size <= len(keyword)]
+        if sizes:
+            return ngrams(keyword, sizes[-1])
+
+    def add(self, key, text):
+        """
+        添加或更新一个键所对应的文本
+
+        :param key: 键
+        :param text: 文本
+        """
+        if key in self._texts:
+            self.remove(key)
+        text = normalize(text)
+        self._texts[key] = text
+        for gram in self._grams(text):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        """
+        移除一个键
+
+        :param key: 键
+        """
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._grams(text):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def candidates(self, keyword):
+        """
+        根据索引获取可能包含关键词的键 (未经校验)
+
+        :param keyword: 统一形式的单个关键词
+        :return: 键的集合，若关键词短于所有片段长度，则为 None (表示无法缩小范围)
+        """
+        grams = self._query_grams(keyword)
+        if not grams:
+            return
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        found = set(postings[0])
+        for keys in postings[1:]:
+            if not found:
+                break
+            found &= keys
+        return found
+
+    def search(self, keywords):
+        """
+        搜索同时包含所有关键词的键
+
+        :param keywords: 关键词，可用空格分割，或为关键词列表
+        :return: 键的集合
+        """
+        keywords = split_keywords(keywords)
+        if not keywords:
+            return set(self._texts)
+
+        found = None
+        for keyword in sorted(keywords, key=len, reverse=True):
+            keys = self.candidates(keyword)
+            if keys is None:
+                continue
+            found = keys if found is None else found & keys
+            if not found:
+                return found
+
+        if found is None:
+            found = self._texts
+        return {key for key in found if all(kw in self._texts[key] for kw in keywords)}
+
+
+def is_cjk(char):
+    """
+    检查字符是否为中日韩文字 (包括假名、谚文及全角符号)
+
+    :param char: 单个字符
+    """
+    return '\u2e80' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af' or '\uf900' <= char <= '\uffef'
+
+
+class NameIndex(NgramIndex):
+    """
+    | 用于名称搜索的 n-gram 索引，以字符三元组为主，并为包含中日韩文字的片段额外建立二元组。
+    | 中文名称通常较短，因此两个字的关键词同样可以使用索引，更短的关键词则在统一形式的文本中直接查找。
+    | 所有操作都是线程安全的。
+    """
+
+    def __init__(self):
+        super(NameIndex, self).__init__(sizes=(3,))
+        self._lock = threading.RLock()
+
+    def _grams(self, text):
+        for gram in ngrams(text, 3):
+            yield gram
+        for gram in ngrams(text, 2):
+            if is_cjk(gram[0]) or is_cjk(gram[1]):
+                yield gram
+
+    def _query_grams(self, keyword):
+        if len(keyword) >= 3:
+            return ngrams(keyword, 3)
+        elif len(keyword) == 2 and (is_cjk(keyword[0]) or is_cjk(keyword[1])):
+            return {keyword}
+
+    def add(self, key, text):
+        with self._lock:
+            super(NameIndex, self).add(key, text)
+
+    def remove(self, key):
+        with self._lock:
+            super(NameIndex, self).remove(key)
+
+    def search(self, keywords):
+        with self._lock:
+            return super(NameIndex, self).search(keywords)
+
+
+def signature(text):
+    """
+    文本的 n-gram 签名，用于计算相似度。包括所有字符，以及首尾加上空格后的所有字符二元组
+
+    :param text: 统一形式的文本
+    :return: 片段的集合
+    """
+    grams = ngrams(' {} '.format(text), 2)
+    grams.update(text)
+    grams.discard(' ')
+    return grams
+
+
+class SimilarityIndex(object):
+    """
+    | 基于 n-gram 签名的相似度索引，用于对名称进行模糊搜索并按相关度排序。
+    | 相似度为查询与文本签名的 Dice 系数，包含完整查询的文本额外加 1 分，因此直接匹配总是排在模糊匹配之前。
+    """
+
+    def __init__(self):
+        # 片段 => 条目编号的集合
+        self._postings = dict()
+        # 条目编号 => (键, 统一形式的文本, 签名大小)
+        self._entries = list()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, texts):
+        """
+        添加一个键所对应的多个文本 (例如昵称、备注等)，键的得分为其中得分最高的文本的得分
+
+        :param key: 键
+        :param texts: 文本列表
+        """
+        for text in texts:
+            text = normalize(text).strip()
+            if not text:
+                continue
+            grams = signature(text)
+            entry = len(self._entries)
+            self._entries.append((key, text, len(grams)))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(entry)
+
+    def top(self, query, k=10):
+        """
+        获取与查询最相似的 k 个键
+
+        :param query: 查询文本
+        :param k: 最多返回的数量
+        :return: (键, 得分) 的列表，按得分从高到低排列，得分相同时按键排列
+        """
+
+        query = normalize(query).strip()
+        if not query or k < 1:
+            return list()
+        grams = signature(query)
+        size = len(grams)
+        postings = sorted(((gram, self._postings.get(gram, set())) for gram in grams), key=lambda x: len(x[1]))
+
+        # 包含完整查询的文本，必然包含查询中的所有字符及内部的二元组 (不含首尾加上的空格)。
+        # 因此只要其中任意一个片段的条目已全部计算，未计算的条目就不可能获得额外的 1 分。
+        required = ngrams(query, 2) | set(query)
+
+        # 与查询共有至少 t 个片段的条目，必然出现在最少的 size - t + 1 个片段的条目集合中。
+        # 因此从 t = size 开始，每次仅需加入一个片段的条目，并计算这些条目的得分。
+        # 未计算的条目共有的片段少于 t 个，得分不会超过 2(t-1)/(size+t-1) (尚可能包含查询时再加 1)，
+        # 当已有 k 个键的得分超过这个上限时，即可停止。
+        scores = dict()
+        seen = set()
+        bonus_possible = True
+        for t in range(size, 0, -1):
+            gram, entries = postings[size - t]
+            for entry in entries - seen:
+                key, text, entry_size = self._entries[entry]
+                count = sum(1 for _, others in postings if entry in others)
+                score = 2 * count / (size + entry_size)
+                if query in text:
+                    score += 1
+                if score > scores.get(key, 0):
+                    scores[key] = score
+            seen |= entries
+            if gram in required:
+                bonus_possible = False
+
+            bound = 2 * (t - 1) / (size + t - 1)
+            if bonus_possible:
+                bound += 1
+            if sum(1 for score in scores.values() if score > bound) >= k:
+                break
+
+        return heapq.nsmallest(k, scores.items(), key=lambda x: (-x[1], x[0]))
@@ -3,6 +3,8 @@ from functools import wraps
 
 import re
 
+from wxpy.utils.constants import NAME_ATTRIBUTES
+
 
 def handle_response(to_class=None):
     """
@@ -57,6 +59,22 @@ def handle_response(to_class=None):
     return decorator
 
 
+class cached_property(object):
+    """
+    装饰器：将方法转化为仅在首次访问时计算，并缓存结果的属性
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.func.__name__] = self.func(instance)
+        return value
+
+
 def ensure_list(x, except_false=True):
     """
     若传入的对象不为列表，则转化为列表
@@ -82,7 +100,7 @@ def match_name(chat, keywords):
             keywords = re.split(r'\s+', keywords)
         keywords = list(map(lambda x: x.lower(), keywords))
         for kw in keywords:
-            for attr in 'nick_name', 'alias', 'remark_name', 'display_name':
+            for attr in NAME_ATTRIBUTES:
                 if kw in str(getattr(chat, attr, '')).lower():
                     break
             else:
@@ -90,6 +108,16 @@ def match_name(chat, keywords):
     return True
 
 
+def name_text(chat):
+    """
+    将 Chat 对象的各个名称 (昵称、微信号、备注、群名片) 合并为用于建立名称索引的文本
+
+    :param chat: Chat 对象
+    :return: 以换行符分隔的名称文本
+    """
+    return '\n'.join(str(getattr(chat, attr, None) or '') for attr in NAME_ATTRIBUTES)
+
+
 def list_or_single(func, i, *args, **kwargs):
     """
     将单个对象或列表中的每个项传入给定的函数，并返回单个结果或列表结果，类似于 map 函数
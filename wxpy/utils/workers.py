@@ -0,0 +1,230 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from queue import Full
+
+from wxpy.utils.constants import BLOCK, DROP_OLDEST, REJECT
+
+logger = logging.getLogger('wxpy')
+
+
+class WorkerPool(object):
+    """
+    | 由固定数量的工作线程和有界等待队列组成的线程池，用于执行已注册的消息处理函数等任务。
+    | 当等待队列已满时，根据 `overflow` 策略阻塞提交者、丢弃最早的任务，或拒绝新的任务。
+    """
+
+    def __init__(self, workers=10, max_pending=1000, overflow=BLOCK, name='wxpy-worker'):
+        """
+        :param workers: 工作线程的数量
+        :param max_pending: 等待队列的最大长度，为 0 或 None 时不限制
+        :param overflow: 队列已满时的策略，可为 BLOCK, DROP_OLDEST, REJECT
+        :param name: 工作线程的名称前缀
+        """
+
+        if overflow not in (BLOCK, DROP_OLDEST, REJECT):
+            raise ValueError('unknown overflow policy: {}'.format(overflow))
+
+        self.workers = workers
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.name = name
+
+        #: 因队列已满而被丢弃的任务数量
+        self.dropped = 0
+        #: 因队列已满而被拒绝的任务数量
+        self.rejected = 0
+
+        self._pending = deque()
+        self._threads = list()
+        self._shutdown = False
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def __repr__(self):
+        return '<{}: {} workers, {} pending>'.format(
+            self.__class__.__name__, len(self._threads), self.pending)
+
+    @property
+    def pending(self):
+        """
+        等待执行的任务数量
+        """
+        return len(self._pending)
+
+    def _is_full(self):
+        return self.max_pending and len(self._pending) >= self.max_pending
+
+    def submit(self, func, *args, **kwargs):
+        """
+        提交一个任务
+
+        :param func: 需执行的函数
+        :param args: 函数的 args
+        :param kwargs: 函数的 kwargs
+        :return: 任务的 :class:`concurrent.futures.Future` 对象
+        :raises queue.Full: 当策略为 REJECT 且队列已满时抛出
+        """
+
+        future = Future()
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot submit after shutdown')
+
+            while self._is_full():
+                if self.overflow == BLOCK:
+                    self._not_full.wait()
+                elif self.overflow == DROP_OLDEST:
+                    self._pending.popleft()[0].cancel()
+                    self.dropped += 1
+                else:
+                    self.rejected += 1
+                    raise Full('{} pending tasks in {}'.format(len(self._pending), self.name))
+
+            self._pending.append((future, func, args, kwargs))
+            self._start_threads()
+            self._not_empty.notify()
+
+        return future
+
+    def _start_threads(self):
+        while len(self._threads) < self.workers:
+            t = threading.Thread(
+                target=self._work, daemon=True,
+                name='{}-{}'.format(self.name, len(self._threads)))
+            self._threads.append(t)
+            t.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._shutdown:
+                    self._not_empty.wait()
+                if not self._pending:
+                    return
+                future, func, args, kwargs = self._pending.popleft()
+                self._not_full.notify()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        """
+        停止接受新的任务，并在执行完剩余的任务后结束工作线程
+
+        :param wait: 是否等待所有工作线程结束
+        """
+        with self._lock:
+            self._shutdown = True
+            self._not_empty.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+class OrderedLanes(object):
+    """
+    | 在 :class:`WorkerPool` 之上按键划分的执行通道。
+    | 相同键的任务按提交顺序依次执行，不同键的任务仍在线程池中并行执行。
+    | 每个通道的等待任务数量同样受线程池的 `max_pending` 和 `overflow` 策略约束。
+    """
+
+    def __init__(self, pool):
+        """
+        :param pool: 用于执行任务的 :class:`WorkerPool`
+        """
+        self.pool = pool
+
+        # 键 => 等待执行的任务，仅在通道有任务时存在
+        self._lanes = dict()
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+
+    def __repr__(self):
+        return '<{}: {} busy lanes>'.format(self.__class__.__name__, len(self._lanes))
+
+    def _is_full(self, lane):
+        return self.pool.max_pending and len(lane) >= self.pool.max_pending
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        向指定键的通道提交一个任务
+
+        :param key: 通道的键，例如聊天对象的 user_name
+        :param func: 需执行的函数
+        :param args: 函数的 args
+        :param kwargs: 函数的 kwargs
+        :return: 任务的 :class:`concurrent.futures.Future` 对象
+        :raises queue.Full: 当策略为 REJECT 且队列已满时抛出
+        """
+
+        future = Future()
+        task = future, func, args, kwargs
+
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is not None:
+                while self._is_full(lane) and lane is self._lanes.get(key):
+                    if self.pool.overflow == BLOCK:
+                        self._not_full.wait()
+                    elif self.pool.overflow == DROP_OLDEST:
+                        lane.popleft()[0].cancel()
+                        self.pool.dropped += 1
+                    else:
+                        self.pool.rejected += 1
+                        raise Full('{} pending tasks in lane {}'.format(len(lane), key))
+                if lane is self._lanes.get(key):
+                    lane.append(task)
+                    return future
+            lane = self._lanes[key] = deque([task])
+
+        try:
+            runner = self.pool.submit(self._drain, key, lane)
+        except Full:
+            self._abandon(key, lane)
+            raise
+        runner.add_done_callback(lambda f: f.cancelled() and self._abandon(key, lane))
+
+        return future
+
+    def _abandon(self, key, lane):
+        # 通道的执行任务未能进入线程池，取消其中所有等待的任务
+        with self._lock:
+            if self._lanes.get(key) is lane:
+                del self._lanes[key]
+            while lane:
+                lane.popleft()[0].cancel()
+            self._not_full.notify_all()
+
+    def _drain(self, key, lane):
+        while True:
+            with self._lock:
+                if not lane:
+                    if self._lanes.get(key) is lane:
+                        del self._lanes[key]
+                    self._not_full.notify_all()
+                    return
+                future, func, args, kwargs = lane.popleft()
+                self._not_full.notify_all()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)